@@ -0,0 +1,247 @@
+"""
+batch.py
+=================
+
+Procesamiento por lotes de varios proyectos (establecimientos), cada uno
+con sus propios ZIPs o carpetas, repartidos en un pool de procesos. Como
+``cli``, no importa PyQt6.
+
+El manifiesto es un JSON de la forma:
+
+.. code-block:: json
+
+    {
+      "hist": "datos/historico.csv",
+      "cache_dir": "cache_fotos",
+      "proyectos": [
+        {"nombre": "obra1", "fuentes": ["obra1/a.zip", "obra1/b.zip"],
+         "pptx": "salida/obra1.pptx", "xlsx": "salida/obra1.xlsx"}
+      ]
+    }
+
+``hist`` y ``cache_dir`` son opcionales; las rutas relativas se toman
+desde la carpeta del manifiesto. Cada proyecto se procesa entero en un
+proceso del pool (sin pools anidados). El motor de recomendaciones se
+construye una vez en el proceso principal y se entrega a cada proceso, y
+todos comparten la misma caché de fotos en disco. Como varios informes se
+generan a la vez, los informes se arman siempre con ``low_memory``.
+
+Al terminar se escribe un resumen JSON con los tiempos, avisos y errores
+de cada proyecto.
+
+Uso ejemplo::
+
+    python -m app.batch semana.json --workers 8 --resumen resumen.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import as_completed
+
+from app.cli import ProgresoConsola
+from app.core.processing import (HIST_DEFAULT, procesar_fuentes, extraer_control_documents,
+                                 detectar_modo)
+from app.core.recommend import load_engine, prime_engine_cache
+from app.report.plan import ReportPlan
+from app.report.pptx_writer import export_plan_to_pptx_report, FORMATO_PPTX
+from app.report.xlsx_writer import export_plan_to_xlsx_report, FORMATO_XLSX
+from app.utils.image_cache import CacheImagenes
+from app.utils.procesos import crear_pool
+
+# Caché de fotos del proceso actual (la fija ``_init_worker_lote``)
+_CACHE: CacheImagenes | None = None
+
+
+def leer_manifiesto(path: str) -> dict:
+    """Lee el manifiesto y resuelve sus rutas relativas a su propia carpeta."""
+    with open(path, "r", encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+
+    def _ruta(p):
+        return os.path.normpath(os.path.join(base, p)) if p else p
+
+    proyectos = []
+    for i, proyecto in enumerate(manifiesto.get("proyectos", []), 1):
+        fuentes = proyecto.get("fuentes") or []
+        if isinstance(fuentes, str):
+            fuentes = [fuentes]
+        proyectos.append({
+            "nombre": proyecto.get("nombre") or f"proyecto_{i}",
+            "fuentes": [_ruta(f) for f in fuentes],
+            "pptx": _ruta(proyecto.get("pptx")),
+            "xlsx": _ruta(proyecto.get("xlsx")),
+        })
+    return {
+        "hist": _ruta(manifiesto.get("hist")),
+        "cache_dir": _ruta(manifiesto.get("cache_dir")),
+        "proyectos": proyectos,
+    }
+
+
+def _init_worker_lote(hist_path: str, engine, cache_dir: str | None, usar_cache: bool) -> None:
+    """Deja listos en el proceso el motor ya construido y la caché compartida."""
+    global _CACHE
+    if engine is not None:
+        try:
+            prime_engine_cache(hist_path, engine)
+        except OSError:
+            pass
+    _CACHE = CacheImagenes(cache_dir) if usar_cache else None
+
+
+def procesar_proyecto(proyecto: dict, hist_path: str | None = None) -> dict:
+    """Procesa un proyecto del manifiesto y genera sus informes.
+
+    Nunca lanza excepciones: los errores quedan en el resultado, que es la
+    entrada del proyecto en el resumen.
+    """
+    resultado = {
+        "nombre": proyecto["nombre"],
+        "estado": "ok",
+        "grupos": 0,
+        "fotos": 0,
+        "tiempos": {},
+        "avisos": [],
+        "error": None,
+        "salidas": {},
+    }
+    inicio = time.perf_counter()
+    archivos = None
+    plan = None
+    try:
+        faltan = [f for f in proyecto["fuentes"] if not os.path.exists(f)]
+        if not proyecto["fuentes"] or faltan:
+            raise FileNotFoundError(f"no existe: {', '.join(faltan)}" if faltan else "el proyecto no tiene fuentes")
+
+        t = time.perf_counter()
+        grupos, archivos, errors = procesar_fuentes(
+            proyecto["fuentes"], mode=detectar_modo(proyecto["fuentes"]), hist_path=hist_path, max_workers=1
+        )
+        resultado["tiempos"]["procesar"] = round(time.perf_counter() - t, 3)
+        resultado["avisos"] = errors
+        resultado["grupos"] = len(grupos)
+        resultado["fotos"] = sum(len(g.fotos) for g in grupos.values())
+        if not grupos:
+            raise ValueError("no se encontraron grupos para generar informes")
+
+        # Un solo plan para los dos informes del proyecto
+        plan = ReportPlan(grupos, archivos, cache=_CACHE)
+        if proyecto.get("pptx") and proyecto.get("xlsx"):
+            t = time.perf_counter()
+            plan.preparar_imagenes([FORMATO_PPTX, FORMATO_XLSX], max_workers=1)
+            resultado["tiempos"]["fotos"] = round(time.perf_counter() - t, 3)
+        if proyecto.get("pptx"):
+            t = time.perf_counter()
+            export_plan_to_pptx_report(plan, proyecto["pptx"], max_workers=1, low_memory=True)
+            resultado["tiempos"]["pptx"] = round(time.perf_counter() - t, 3)
+            resultado["salidas"]["pptx"] = proyecto["pptx"]
+        if proyecto.get("xlsx"):
+            t = time.perf_counter()
+            export_plan_to_xlsx_report(plan, proyecto["xlsx"], control_documents=extraer_control_documents(archivos),
+                                       max_workers=1, low_memory=True)
+            resultado["tiempos"]["xlsx"] = round(time.perf_counter() - t, 3)
+            resultado["salidas"]["xlsx"] = proyecto["xlsx"]
+    except Exception as e:
+        resultado["estado"] = "error"
+        resultado["error"] = f"{type(e).__name__}: {e}"
+        resultado["traceback"] = traceback.format_exc()
+    finally:
+        if plan is not None:
+            plan.close()
+        if archivos is not None:
+            archivos.close()
+    resultado["tiempos"]["total"] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+def _peso(proyecto: dict) -> int:
+    """Tamaño aproximado del proyecto, para lanzar primero los más grandes."""
+    total = 0
+    for fuente in proyecto["fuentes"]:
+        try:
+            total += os.path.getsize(fuente) if os.path.isfile(fuente) else 0
+        except OSError:
+            pass
+    return total
+
+
+def ejecutar_lote(manifiesto: dict, max_workers: int | None = None, usar_cache: bool = True,
+                  progress_callback=None) -> dict:
+    """Procesa todos los proyectos de ``manifiesto`` (ver ``leer_manifiesto``).
+
+    Retorna el resumen, con los proyectos en el mismo orden del manifiesto.
+    """
+    proyectos = manifiesto["proyectos"]
+    if max_workers is None:
+        max_workers = min(len(proyectos), os.cpu_count() or 1) or 1
+
+    hist_path = manifiesto.get("hist")
+    hp = hist_path or HIST_DEFAULT
+    try:
+        engine = load_engine(hp)
+    except Exception:
+        # Cada proyecto reportará el error al intentar cargar el histórico
+        engine = None
+
+    inicio = time.perf_counter()
+    resultados: list = [None] * len(proyectos)
+    # Los proyectos más pesados primero, para que no queden solos al final
+    orden = sorted(range(len(proyectos)), key=lambda i: _peso(proyectos[i]), reverse=True)
+    with crear_pool(max_workers, initializer=_init_worker_lote,
+                    initargs=(hp, engine, manifiesto.get("cache_dir"), usar_cache)) as pool:
+        futuros = {pool.submit(procesar_proyecto, proyectos[i], hist_path): i for i in orden}
+        for hechos, futuro in enumerate(as_completed(futuros), 1):
+            i = futuros[futuro]
+            try:
+                resultados[i] = futuro.result()
+            except Exception as e:
+                # El proceso murió (p. ej. sin memoria) antes de devolver el resultado
+                resultados[i] = {"nombre": proyectos[i]["nombre"], "estado": "error",
+                                 "error": f"{type(e).__name__}: {e}", "tiempos": {}, "avisos": []}
+            if progress_callback:
+                r = resultados[i]
+                progress_callback.emit(f"[{hechos}/{len(proyectos)}] {r['nombre']}: {r['estado']}"
+                                       f" ({r['tiempos'].get('total', 0):.1f} s)")
+
+    return {
+        "workers": max_workers,
+        "duracion": round(time.perf_counter() - inicio, 3),
+        "proyectos_ok": sum(1 for r in resultados if r["estado"] == "ok"),
+        "proyectos_error": sum(1 for r in resultados if r["estado"] != "ok"),
+        "proyectos": resultados,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.batch",
+                                     description="Genera los informes de todos los proyectos de un manifiesto.")
+    parser.add_argument("manifiesto", help="JSON con la lista de proyectos")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="proyectos en paralelo (por defecto, la cantidad de núcleos)")
+    parser.add_argument("--resumen", help="ruta del resumen JSON (por defecto, junto al manifiesto)")
+    parser.add_argument("--sin-cache", action="store_true", help="no usar la caché de fotos en disco")
+    args = parser.parse_args(argv)
+
+    manifiesto = leer_manifiesto(args.manifiesto)
+    if not manifiesto["proyectos"]:
+        parser.error("el manifiesto no tiene proyectos")
+    resumen = ejecutar_lote(manifiesto, max_workers=args.workers, usar_cache=not args.sin_cache,
+                            progress_callback=ProgresoConsola())
+
+    resumen_path = args.resumen or os.path.splitext(args.manifiesto)[0] + ".resumen.json"
+    with open(resumen_path, "w", encoding="utf-8") as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+    print(f"{resumen['proyectos_ok']} proyectos generados, {resumen['proyectos_error']} con error "
+          f"en {resumen['duracion']:.1f} s. Resumen: {resumen_path}", file=sys.stderr)
+    return 0 if resumen["proyectos_error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
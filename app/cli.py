@@ -0,0 +1,128 @@
+"""
+cli.py
+=================
+
+Generación de informes por línea de comandos, sin interfaz gráfica (no
+importa PyQt6), para correr en un servidor o en tareas programadas.
+
+Uso ejemplo::
+
+    python -m app.cli obra1.zip obra2.zip --hist datos/historico.csv \\
+        --pptx informe.pptx --xlsx informe.xlsx
+
+Las fuentes pueden ser ZIPs o carpetas de proyecto (todas del mismo tipo).
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from app.core.processing import procesar_fuentes, extraer_control_documents, detectar_modo
+from app.report.plan import ReportPlan
+from app.report.pptx_writer import export_plan_to_pptx_report, FORMATO_PPTX
+from app.report.xlsx_writer import export_plan_to_xlsx_report, FORMATO_XLSX
+from app.utils.image_cache import CacheImagenes
+
+
+class ProgresoConsola:
+    """Sustituto de la señal ``progress`` de Qt: imprime lo que recibe en ``emit``.
+
+    Los mensajes de texto se imprimen tal cual; los porcentajes (enteros) de
+    los exportadores se imprimen en una sola línea que se va actualizando.
+    """
+
+    def __init__(self, etiqueta: str = "", stream=None):
+        self.etiqueta = etiqueta
+        self.stream = stream or sys.stderr
+        self._ultimo = None
+
+    def emit(self, valor) -> None:
+        if isinstance(valor, int):
+            if valor != self._ultimo:
+                self._ultimo = valor
+                fin = "\n" if valor >= 100 else ""
+                print(f"\r{self.etiqueta}{valor:3d}%", end=fin, file=self.stream, flush=True)
+        else:
+            print(valor, file=self.stream, flush=True)
+
+
+def _crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli",
+        description="Procesa ZIPs o carpetas de inspección y genera los informes PPTX/XLSX.",
+    )
+    parser.add_argument("fuentes", nargs="+", help="ZIPs o carpetas de proyecto")
+    parser.add_argument("--hist", help="historico.csv para las recomendaciones (por defecto datos/historico.csv)")
+    parser.add_argument("--pptx", help="ruta del informe PPTX a generar")
+    parser.add_argument("--xlsx", help="ruta del informe XLSX a generar")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="procesos a usar (por defecto, la cantidad de núcleos)")
+    parser.add_argument("--cache-dir", help="carpeta de la caché de fotos preparadas")
+    parser.add_argument("--sin-cache", action="store_true", help="no usar la caché de fotos en disco")
+    parser.add_argument("--bajo-consumo", action="store_true",
+                        help="armar los informes con memoria acotada (fotos y hojas en archivos temporales)")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = _crear_parser()
+    args = parser.parse_args(argv)
+    if not args.pptx and not args.xlsx:
+        parser.error("indica al menos un informe a generar con --pptx y/o --xlsx")
+
+    faltan = [f for f in args.fuentes if not os.path.exists(f)]
+    if faltan:
+        parser.error(f"no existe: {', '.join(faltan)}")
+    try:
+        mode = detectar_modo(args.fuentes)
+    except ValueError as e:
+        parser.error(str(e))
+
+    cache = None if args.sin_cache else CacheImagenes(args.cache_dir)
+    inicio = time.perf_counter()
+
+    t = time.perf_counter()
+    grupos, archivos, errors = procesar_fuentes(
+        args.fuentes, mode=mode, hist_path=args.hist, max_workers=args.workers,
+        progress_callback=ProgresoConsola(),
+    )
+    for error in errors:
+        print(f"AVISO: {error}", file=sys.stderr)
+    total_fotos = sum(len(g.fotos) for g in grupos.values())
+    print(f"Procesado: {len(grupos)} grupos, {total_fotos} fotos en {time.perf_counter() - t:.1f} s", file=sys.stderr)
+    if not grupos:
+        print("No se encontraron grupos para generar informes.", file=sys.stderr)
+        archivos.close()
+        return 1
+
+    # Un solo plan para los dos informes: textos y fotos se preparan una vez
+    plan = ReportPlan(grupos, archivos, cache=cache)
+    try:
+        if args.pptx and args.xlsx:
+            t = time.perf_counter()
+            plan.preparar_imagenes([FORMATO_PPTX, FORMATO_XLSX], max_workers=args.workers)
+            print(f"Fotos preparadas ({time.perf_counter() - t:.1f} s)", file=sys.stderr)
+        if args.pptx:
+            t = time.perf_counter()
+            export_plan_to_pptx_report(plan, args.pptx, progress_callback=ProgresoConsola("PPTX: "),
+                                       max_workers=args.workers, low_memory=args.bajo_consumo)
+            print(f"PPTX guardado en {args.pptx} ({time.perf_counter() - t:.1f} s)", file=sys.stderr)
+        if args.xlsx:
+            t = time.perf_counter()
+            export_plan_to_xlsx_report(plan, args.xlsx, progress_callback=ProgresoConsola("XLSX: "),
+                                       control_documents=extraer_control_documents(archivos),
+                                       max_workers=args.workers, low_memory=args.bajo_consumo)
+            print(f"XLSX guardado en {args.xlsx} ({time.perf_counter() - t:.1f} s)", file=sys.stderr)
+    finally:
+        plan.close()
+        archivos.close()
+
+    print(f"Total: {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,6 +1,7 @@
-import zipfile, re, os
+import re, os, io, itertools, json, csv
+from concurrent.futures import as_completed
 from dataclasses import dataclass, field, asdict
-from typing import Dict
+from typing import Dict, Iterable, Iterator, Mapping
 from pathlib import Path
 try:
     from app.core.paths import resource_path
@@ -16,11 +17,17 @@ except Exception:
         return str((Path(__file__).resolve().parents[2] / rel))
     
 from app.core.recommend import load_engine
-from app.core.recommend import load_engine, RecommendationEngine
+from app.core.recommend import load_engine, RecommendationEngine, prime_engine_cache
+from app.core.sources import ZipSource, DirectorySource, CombinedSource, indice_basenames, abrir
+from app.utils.procesos import crear_pool
 
 # Ruta opcional al histórico; si es None se usa el valor por defecto
 HIST_DEFAULT = resource_path("datos/historico.csv")
 
+# Cabecera de bloque en descriptions.txt: "[carpeta] archivo.jpg"
+_FOTO_RE = re.compile(r'\[(.+?)\]\s+(\S+\.(?:jpe?g|png))', re.I)
+_WS_RE = re.compile(r'\s+')
+
 @dataclass
 class Foto:
     filename: str
@@ -28,6 +35,14 @@ class Foto:
     specific_detail: str # La pregunta/detalle específico de descriptions.txt
     carpeta: str
     path_tmp: str | None = None
+    archive_key: str | None = None  # Clave canónica de la foto en el origen de datos
+
+    @property
+    def detalle(self) -> str:
+        """Parte de ``specific_detail`` después del primer '+' (o el detalle completo)."""
+        if '+' in self.specific_detail:
+            return self.specific_detail.split('+', 1)[1].strip()
+        return self.specific_detail
 
 @dataclass
 class Grupo:
@@ -35,50 +50,59 @@ class Grupo:
     fotos: list[Foto] = field(default_factory=list)
     recomendaciones: list[str] = field(default_factory=list)
 
-def cargar_zip(path_zip: str) -> Dict[str, bytes]:
-    out = {}
-    with zipfile.ZipFile(path_zip, "r") as zf:
-        for n in zf.namelist():
-            # Normalizar separadores de ruta a '/' para consistencia
-            normalized_name = n.replace('\\', '/')
-            out[normalized_name] = zf.read(n)
-    return out
+def cargar_zip(path_zip: str) -> ZipSource:
+    """
+    Abre un ZIP de inspección sin cargar las fotos en memoria.
 
-def cargar_directorio(path_dir: str) -> Dict[str, bytes]:
+    Retorna un mapping ``ruta -> bytes`` que sólo indexa los nombres; cada
+    imagen se descomprime cuando se accede a ella.
     """
-    Lee todos los archivos de un directorio y sus subdirectorios y los retorna
-    en un diccionario similar al de cargar_zip.
+    return ZipSource(path_zip)
+
+def cargar_directorio(path_dir: str) -> DirectorySource:
     """
-    out = {}
-    base_path = Path(path_dir)
-    for root, _, files in os.walk(base_path):
-        for name in files:
-            file_path = Path(root) / name
-            # La clave es la ruta relativa al directorio base, usando '/' como separador
-            relative_path = file_path.relative_to(base_path).as_posix()
-            out[relative_path] = file_path.read_bytes()
-    return out
-
-def _find_image_data(archivos: Dict[str, bytes], foto: Foto) -> bytes | None:
+    Indexa los archivos de un directorio y sus subdirectorios y los retorna
+    en un mapping similar al de cargar_zip.
+
+    Sólo se registran rutas y tamaños; las fotos se leen del disco cuando se
+    necesitan y los archivos no relevantes (videos, respaldos) se omiten.
     """
-    Busca los datos de una imagen en el diccionario de archivos de forma robusta.
-    Intenta varias combinaciones de rutas para maximizar la compatibilidad.
+    return DirectorySource(path_dir)
+
+def resolver_foto(archivos: Mapping[str, bytes], foto: Foto) -> str | None:
     """
-    # 1. La ruta ideal y más común (normalizada)
-    path1 = f"{foto.carpeta}/{foto.filename}"
-    if path1 in archivos:
-        return archivos[path1]
+    Retorna la clave de ``archivos`` que corresponde a ``foto``.
 
-    # 2. Ruta con separadores de Windows (por si acaso)
-    path2 = f"{foto.carpeta}\\{foto.filename}".replace('/', '\\')
-    if path2 in archivos:
-        return archivos[path2]
+    Las fotos parseadas ya traen ``archive_key`` resuelta; para las demás se
+    prueban varias combinaciones de rutas (para maximizar la compatibilidad)
+    y el resultado se guarda en la foto para no repetir la búsqueda.
+    """
+    if foto.archive_key and foto.archive_key in archivos:
+        return foto.archive_key
+
+    candidatos = (
+        # 1. La ruta ideal y más común (normalizada)
+        f"{foto.carpeta}/{foto.filename}",
+        # 2. Ruta con separadores de Windows (por si acaso)
+        f"{foto.carpeta}\\{foto.filename}".replace('/', '\\'),
+        # 3. Solo el nombre del archivo (si está en la raíz)
+        foto.filename,
+    )
+    clave = next((c for c in candidatos if c in archivos), None)
+    if clave is None:
+        # 4. Nombre de archivo único en cualquier carpeta
+        matches = indice_basenames(archivos).get(foto.filename, [])
+        if len(matches) == 1:
+            clave = matches[0]
 
-    # 3. Solo el nombre del archivo (si está en la raíz)
-    if foto.filename in archivos:
-        return archivos[foto.filename]
+    if clave is not None:
+        foto.archive_key = clave
+    return clave
 
-    return None
+def _find_image_data(archivos: Mapping[str, bytes], foto: Foto) -> bytes | None:
+    """Busca los datos de una imagen usando la clave canónica de la foto."""
+    clave = resolver_foto(archivos, foto)
+    return archivos[clave] if clave is not None else None
 
 def _create_group_lookup(txt_grupos: str) -> Dict[str, str]:
     """Convierte el texto de grupos.txt en un diccionario para búsqueda rápida."""
@@ -89,33 +113,43 @@ def _create_group_lookup(txt_grupos: str) -> Dict[str, str]:
             continue
         
         # La clave sigue siendo solo el código, para una búsqueda limpia
-        parts = re.split(r'\s+', full_line, 1)
+        parts = _WS_RE.split(full_line, 1)
         if len(parts) == 2:
             key = parts[0].strip()
             # El valor ahora es la línea completa, para no perder la numeración
             lookup[key] = key + " " + parts[1].strip()
     return lookup
 
-def _parse_descriptions(txt_descriptions: str, group_lookup: Dict[str, str], archivos: Dict[str, bytes]) -> tuple[list[Foto], list[str]]:
+def _leer_lineas(archivos: Mapping[str, bytes], nombre: str) -> Iterator[str]:
+    """Lee un archivo de texto del origen de datos línea a línea, sin cargarlo entero.
+
+    Corta las líneas igual que ``str.splitlines`` sobre el texto completo
+    (también en ``\\x0b``, ``\\x0c``, ``\\x85``, ``\\u2028``...) y sin el salto final.
     """
-    Parsea descriptions.txt, empareja fotos de forma robusta y asigna el nombre oficial del grupo.
-    
-    Retorna una tupla: (lista de fotos encontradas, lista de advertencias).
+    with abrir(archivos, nombre) as raw, io.TextIOWrapper(raw, encoding="utf-8", errors="ignore") as txt:
+        for linea in txt:
+            yield from linea.splitlines()
+
+def _iter_fotos(lineas: Iterable[str], group_lookup: Dict[str, str], archivos: Mapping[str, bytes],
+                warnings: list[str]) -> Iterator[Foto]:
+    """
+    Recorre las líneas de descriptions.txt y produce las fotos a medida que se
+    completan sus bloques, emparejándolas de forma robusta y asignando el
+    nombre oficial del grupo. Las advertencias se agregan a ``warnings``.
     """
-    fotos = []
-    warnings = []
     bloque = {}
+    basenames = indice_basenames(archivos)
 
-    for line_num, line in enumerate(txt_descriptions.splitlines(), 1):
+    for line_num, line in enumerate(lineas, 1):
         line = line.strip()
-        m = re.match(r'\[(.+?)\]\s+(\S+\.jpg)', line, flags=re.I)
+        m = _FOTO_RE.match(line)
         if m:
             # Si había un bloque anterior sin descripción, se descarta.
             bloque = {"carpeta": m.group(1), "filename": m.group(2)}
         elif line.lower().startswith("description:") and bloque:
             desc_content = line.split(":", 1)[1].strip()
             
-            desc_parts = re.split(r'\s+', desc_content, 1)
+            desc_parts = _WS_RE.split(desc_content, 1)
             numbering_code = desc_parts[0].strip()
             specific_detail = desc_parts[1].strip() if len(desc_parts) > 1 else ''
             
@@ -124,52 +158,72 @@ def _parse_descriptions(txt_descriptions: str, group_lookup: Dict[str, str], arc
             # --- Lógica de emparejamiento robusto ---
             filename_from_desc = bloque["filename"]
             carpeta_from_desc = bloque["carpeta"]
+            bloque = {}
             
             # Intento 1: Ruta ideal (carpeta/archivo.jpg)
             ideal_path = f"{carpeta_from_desc}/{filename_from_desc}"
+            archive_key = ideal_path
             if ideal_path not in archivos:
                 # Intento 2: Fallback - buscar solo por nombre de archivo
-                matches = [path for path in archivos if os.path.basename(path) == filename_from_desc]
+                matches = basenames.get(filename_from_desc, [])
                 if len(matches) == 1:
                     # Éxito: se encontró una única coincidencia. Se corrige la carpeta.
                     carpeta_from_desc = os.path.dirname(matches[0]).replace('\\', '/')
+                    archive_key = matches[0]
                 elif len(matches) > 1:
                     warnings.append(f"Línea {line_num}: Nombre de archivo '{filename_from_desc}' es ambiguo (encontrado en {len(matches)} ubicaciones). Se omitió la foto.")
-                    bloque = {}
                     continue
                 else:
                     warnings.append(f"Línea {line_num}: No se encontró la foto '{filename_from_desc}' en ninguna carpeta.")
-                    bloque = {}
                     continue
             
-            fotos.append(Foto(
+            yield Foto(
                 filename=filename_from_desc,
                 group_name=official_group_name,
                 specific_detail=specific_detail,
                 carpeta=carpeta_from_desc, # Usar la carpeta corregida si fue necesario
-            ))
-            bloque = {}
+                archive_key=archive_key,
+            )
+
+def _parse_descriptions(txt_descriptions: str | Iterable[str], group_lookup: Dict[str, str], archivos: Mapping[str, bytes]) -> tuple[list[Foto], list[str]]:
+    """
+    Parsea descriptions.txt (texto completo o iterable de líneas), empareja fotos de forma robusta y asigna el nombre oficial del grupo.
+    
+    Retorna una tupla: (lista de fotos encontradas, lista de advertencias).
+    """
+    if isinstance(txt_descriptions, str):
+        txt_descriptions = txt_descriptions.splitlines()
+    warnings = []
+    fotos = list(_iter_fotos(txt_descriptions, group_lookup, archivos, warnings))
     return fotos, warnings
 
 def asignar_recomendaciones(grupos: Dict[str, Grupo], engine: RecommendationEngine, top_k: int = 1):
-    """Rellena grupo.recomendaciones usando el motor."""
-    for g in grupos.values():
+    """Rellena grupo.recomendaciones usando el motor (una sola consulta por lotes para todo el proyecto)."""
+    lista_grupos = list(grupos.values())
+    consultas = []
+    for g in lista_grupos:
         # Usa descripción base + agregación de detalles/ubicaciones para contextualizar la consulta
         extra = ", ".join(sorted({f"{f.carpeta} {f.specific_detail}".strip() for f in g.fotos if f.specific_detail or f.carpeta}))[:400]
-        sugerencias = engine.suggest(query=g.descripcion, extra_text=extra, top_k=top_k)
+        consultas.append((g.descripcion, extra))
+    for g, sugerencias in zip(lista_grupos, engine.suggest_many(consultas, top_k=top_k)):
         g.recomendaciones = [rec for _, rec in sugerencias] or g.recomendaciones
 
-def procesar_zip(archivos: Dict[str, bytes], hist_path: str | None = None) -> tuple[Dict[str, Grupo], str | None]:
-    # Leer ambos archivos de texto del zip
-    txt_descriptions = archivos.get("descriptions.txt", b"").decode("utf-8", errors="ignore")
+def procesar_zip(archivos: Mapping[str, bytes], hist_path: str | None = None) -> tuple[Dict[str, Grupo], str | None]:
+    # grupos.txt es pequeño y se lee entero; descriptions.txt se procesa en streaming
     txt_grupos = archivos.get("grupos.txt", b"").decode("utf-8", errors="ignore")
-    
-    if not txt_descriptions or not txt_grupos:
-        return {}, "Faltan 'descriptions.txt' o 'grupos.txt' en el origen de datos."
+    faltan_msg = "Faltan 'descriptions.txt' o 'grupos.txt' en el origen de datos."
+    if not txt_grupos or "descriptions.txt" not in archivos:
+        return {}, faltan_msg
+
+    lineas = _leer_lineas(archivos, "descriptions.txt")
+    primera_linea = next(lineas, None)
+    if primera_linea is None:
+        return {}, faltan_msg
         
     group_lookup = _create_group_lookup(txt_grupos)
     
-    fotos, parsing_warnings = _parse_descriptions(txt_descriptions, group_lookup, archivos)
+    parsing_warnings: list[str] = []
+    fotos = _iter_fotos(itertools.chain([primera_linea], lineas), group_lookup, archivos, parsing_warnings)
     
     grupos: Dict[str, Grupo] = {}
     for f in fotos:
@@ -201,4 +255,203 @@ def reaplicar_recomendaciones(grupos: Dict[str, Grupo], hist_path: str) -> str |
         asignar_recomendaciones(grupos, engine, top_k=2)
     except Exception as e:
         error_msg = str(e)
-    return error_msg
\ No newline at end of file
+    return error_msg
+
+def cargar_y_procesar(path: str, mode: str = 'zip', hist_path: str | None = None) -> tuple[Mapping[str, bytes], Dict[str, Grupo], str | None]:
+    """Carga un origen (ZIP o carpeta) y lo procesa. Se ejecuta en los procesos del pool de ingesta."""
+    loader_func = cargar_zip if mode == 'zip' else cargar_directorio
+    archivos = loader_func(path)
+    grupos, error = procesar_zip(archivos, hist_path=hist_path)
+    return archivos, grupos, error
+
+def _init_worker_ingesta(hist_path: str, engine: RecommendationEngine | None) -> None:
+    """Inicializa un proceso del pool con el motor ya construido por el proceso principal."""
+    if engine is not None:
+        try:
+            prime_engine_cache(hist_path, engine)
+        except OSError:
+            pass
+
+def detectar_modo(paths: list[str]) -> str:
+    """Devuelve ``'dir'`` si todos los orígenes son carpetas y ``'zip'`` si son archivos.
+
+    Lanza ``ValueError`` si se mezclan ambos tipos.
+    """
+    carpetas = [os.path.isdir(p) for p in paths]
+    if any(carpetas) and not all(carpetas):
+        raise ValueError("no se pueden mezclar ZIPs y carpetas en una misma ejecución")
+    return 'dir' if carpetas and all(carpetas) else 'zip'
+
+def procesar_fuentes(paths: list[str], mode: str = 'zip', hist_path: str | None = None, max_workers: int | None = None,
+                     progress_callback=None, should_stop=None) -> tuple[Dict[str, Grupo], CombinedSource, list[str]]:
+    """
+    Carga y procesa varios orígenes, cada uno en su propio proceso del pool.
+
+    Los resultados se combinan siempre en el orden de ``paths``, sin importar
+    cuál termine primero, así que el resultado es el mismo que procesarlos uno
+    tras otro. ``progress_callback.emit(str)`` recibe un aviso por origen y
+    ``should_stop()`` permite cancelar los que aún no empezaron.
+
+    Retorna ``(grupos, archivos, errores)``.
+    """
+    total = len(paths)
+    resultados: list = [None] * total
+    if max_workers is None:
+        max_workers = min(total, os.cpu_count() or 1)
+
+    if max_workers <= 1 or total <= 1:
+        for i, path in enumerate(paths):
+            if should_stop and should_stop(): break
+            if progress_callback:
+                progress_callback.emit(f"Procesando {i+1}/{total}: {os.path.basename(path)}...")
+            try:
+                resultados[i] = cargar_y_procesar(path, mode, hist_path)
+            except Exception as e:
+                resultados[i] = e
+    else:
+        if progress_callback:
+            progress_callback.emit(f"Procesando {total} orígenes en paralelo...")
+        # El motor de recomendaciones se construye una sola vez aquí y se
+        # entrega a cada proceso; si falla, cada origen reportará el error.
+        hp = hist_path or HIST_DEFAULT
+        try:
+            engine = load_engine(hp)
+        except Exception:
+            engine = None
+        with crear_pool(max_workers, initializer=_init_worker_ingesta, initargs=(hp, engine)) as pool:
+            futuros = {pool.submit(cargar_y_procesar, path, mode, hist_path): i for i, path in enumerate(paths)}
+            for hechos, futuro in enumerate(as_completed(futuros), 1):
+                i = futuros[futuro]
+                try:
+                    resultados[i] = futuro.result()
+                except Exception as e:
+                    resultados[i] = e
+                if progress_callback:
+                    progress_callback.emit(f"Procesado {hechos}/{total}: {os.path.basename(paths[i])}")
+                if should_stop and should_stop():
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    break
+
+    grupos_acumulados, archivos_acumulados, errors = {}, CombinedSource(), []
+    for path, resultado in zip(paths, resultados):
+        base_name = os.path.basename(path)
+        if resultado is None:
+            continue
+        if isinstance(resultado, Exception):
+            errors.append(f"Error crítico procesando {base_name}: {resultado}")
+            continue
+        nuevos_archivos, nuevos_grupos, error = resultado
+        archivos_acumulados.update(nuevos_archivos)
+        if error: errors.append(f"Error en {base_name}: {error}")
+        for key, grupo_nuevo in nuevos_grupos.items():
+            if key in grupos_acumulados: grupos_acumulados[key].fotos.extend(grupo_nuevo.fotos)
+            else: grupos_acumulados[key] = grupo_nuevo
+    return grupos_acumulados, archivos_acumulados, errors
+
+def extraer_control_documents(archivos: Mapping[str, bytes]) -> Dict[int, str] | None:
+    """Busca un archivo llamado 'control_documents' en ``archivos`` y lo
+    convierte en un dict {numero:int -> situacion:str}. Acepta .json, .csv y .txt."""
+    try:
+        if not archivos:
+            return None
+        candidate = None
+        for path in archivos.keys():
+            base = os.path.basename(path).lower()
+            if base.startswith('control_documents'):
+                candidate = path
+                break
+        if not candidate:
+            return None
+        data = archivos.get(candidate)
+        if not data:
+            return None
+        base = os.path.basename(candidate).lower()
+        # JSON
+        if base.endswith('.json'):
+            try:
+                obj = json.loads(data.decode('utf-8', errors='ignore'))
+                res = {}
+                if isinstance(obj, dict):
+                    for k, v in obj.items():
+                        try:
+                            res[int(k)] = '' if v is None else str(v)
+                        except Exception:
+                            pass
+                elif isinstance(obj, list):
+                    for item in obj:
+                        if isinstance(item, dict):
+                            num = item.get('numero') or item.get('num') or item.get('id')
+                            if num is None:
+                                continue
+                            try:
+                                num = int(num)
+                            except Exception:
+                                continue
+                            res[num] = str(item.get('situacion', ''))
+                return res or None
+            except Exception:
+                return None
+        # CSV
+        if base.endswith('.csv'):
+            try:
+                text = data.decode('utf-8', errors='ignore')
+                f = io.StringIO(text)
+                sample = text[:1024]
+                delimiter = ','
+                if sample.count(';') > sample.count(','):
+                    delimiter = ';'
+                elif '\t' in sample:
+                    delimiter = '\t'
+                reader = csv.reader(f, delimiter=delimiter)
+                headers = next(reader, None)
+                res = {}
+                for row in reader:
+                    if not row:
+                        continue
+                    num = None
+                    situacion = None
+                    if headers and any((h or '').lower().startswith('num') for h in headers):
+                        try:
+                            idx_num = next(i for i,h in enumerate(headers) if (h or '').lower().startswith('num'))
+                            num = int(row[idx_num])
+                        except Exception:
+                            continue
+                        try:
+                            idx_sit = next(i for i,h in enumerate(headers) if (h or '').lower().startswith('sit'))
+                            situacion = row[idx_sit]
+                        except Exception:
+                            situacion = row[-1] if row else ''
+                    else:
+                        for val in row:
+                            try:
+                                num = int(val)
+                                situacion = row[-1]
+                                break
+                            except Exception:
+                                continue
+                    if num is not None:
+                        res[num] = situacion or ''
+                return res or None
+            except Exception:
+                return None
+        # TXT u otros
+        try:
+            text = data.decode('utf-8', errors='ignore')
+        except Exception:
+            return None
+        res = {}
+        pattern = re.compile(r"(?ms)^\s*(\d{1,2})\b[\s\S]*?SITUACI[OÓ]N\s*:\s*(.+?)(?=^\s*\d{1,2}\b|\Z)", re.I)
+        for m in pattern.finditer(text):
+            try:
+                num = int(m.group(1))
+            except Exception:
+                continue
+            sit = m.group(2).strip()
+            res[num] = sit
+        if not res:
+            simple = re.compile(r"^\s*(\d{1,2})\s*[:.-]\s*(.+)$", re.M)
+            for m in simple.finditer(text):
+                res[int(m.group(1))] = m.group(2).strip()
+        return res or None
+    except Exception:
+        return None
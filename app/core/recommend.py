@@ -1,8 +1,12 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Iterable, List, Tuple, Dict
+from typing import Iterable, List, Tuple, Dict, TYPE_CHECKING
+from collections import Counter
 from difflib import SequenceMatcher
-import re, unicodedata, pandas as pd
+import hashlib, json, os, re, threading, unicodedata
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 _WORD_RE = re.compile(r"[a-zA-ZáéíóúñüÁÉÍÓÚÑÜ0-9]+")
 
@@ -21,31 +25,123 @@ class RecConfig:
     stopwords: set[str] = None
     keyword_boost: Dict[str,float] = None  # {"fisura":0.05,"humedad":0.04}
 
+# Registro compilado de una fila del histórico:
+# (tag, obs, rec, src, tag normalizado, obs normalizada, tokens del tag, tokens de la obs)
+HistRecord = Tuple[str, str, str, str, str, str, List[str], List[str]]
+
+def _df_records(df: pd.DataFrame) -> List[Tuple[str, str, str, str]]:
+    """Extrae (tag, obs, rec, src) de cada fila del DataFrame del histórico."""
+    import pandas as pd
+    cols = {c.upper(): c for c in df.columns}
+    c_tag = cols.get("TAG")
+    c_obs = cols.get("OBSERVACION") or cols.get("OBSERVACIÓN")
+    c_rec = cols.get("RECOMENDACIÓN") or cols.get("RECOMENDACION")
+    c_src = cols.get("FUENTE", None)
+    if not (c_tag and c_rec):
+        raise ValueError("Se requieren columnas TAG y RECOMENDACIÓN")
+
+    out = []
+    for _, r in df.iterrows():
+        tag=str(r[c_tag]) if pd.notna(r[c_tag]) else ""
+        obs=str(r[c_obs]) if c_obs and pd.notna(r[c_obs]) else ""
+        rec=str(r[c_rec]) if pd.notna(r[c_rec]) else ""
+        src=str(r[c_src]) if c_src and pd.notna(r[c_src]) else ""
+        out.append((tag, obs, rec, src))
+    return out
+
+def _compile_records(rows: Iterable[Tuple[str, str, str, str]]) -> List[HistRecord]:
+    """Precalcula textos normalizados y tokens (sin filtrar stopwords) de cada fila."""
+    return [(tag, obs, rec, src, _norm(tag), _norm(obs), sorted(set(_tokens(tag))), sorted(set(_tokens(obs))))
+            for tag, obs, rec, src in rows]
+
 class RecommendationEngine:
     def __init__(self, df: pd.DataFrame, cfg: RecConfig = RecConfig()):
+        self._build(_compile_records(_df_records(df)), cfg)
+
+    @classmethod
+    def from_records(cls, records: Iterable[HistRecord], cfg: RecConfig = RecConfig()) -> RecommendationEngine:
+        """Construye el motor desde registros ya compilados (ver ``_compile_records``), sin pandas."""
+        engine = cls.__new__(cls)
+        engine._build(records, cfg)
+        return engine
+
+    def _build(self, records: Iterable[HistRecord], cfg: RecConfig) -> None:
         self.cfg = cfg
-        cols = {c.upper(): c for c in df.columns}
-        self.c_tag = cols.get("TAG")
-        self.c_obs = cols.get("OBSERVACION") or cols.get("OBSERVACIÓN")
-        self.c_rec = cols.get("RECOMENDACIÓN") or cols.get("RECOMENDACION")
-        self.c_src = cols.get("FUENTE", None)
-        if not (self.c_tag and self.c_rec):
-            raise ValueError("Se requieren columnas TAG y RECOMENDACIÓN")
-
-        def toks(s:str)->set:
-            ts=set(_tokens(s))
+
+        def toks(ts:Iterable[str])->set:
+            ts=set(ts)
             if self.cfg.stopwords: ts={t for t in ts if t not in self.cfg.stopwords}
             return ts
 
         self.rows=[]
-        for _, r in df.iterrows():
-            tag=str(r[self.c_tag]) if pd.notna(r[self.c_tag]) else ""
-            obs=str(r[self.c_obs]) if self.c_obs and pd.notna(r[self.c_obs]) else ""
-            rec=str(r[self.c_rec]) if pd.notna(r[self.c_rec]) else ""
-            src=str(r[self.c_src]) if self.c_src and pd.notna(r[self.c_src]) else ""
-            tok_tag=toks(tag); tok_obs=toks(obs)
+        for tag, obs, rec, src, norm_tag, norm_obs, raw_tag, raw_obs in records:
             self.rows.append({"tag":tag,"obs":obs,"rec":rec,"src":src,
-                              "tok_tag":tok_tag,"tok_obs":tok_obs})
+                              "norm_tag":norm_tag,"norm_obs":norm_obs,
+                              "tok_tag":toks(raw_tag),"tok_obs":toks(raw_obs)})
+
+        # Datos por TAG único (en orden de aparición) para puntuar todos los tags
+        # de una vez: texto normalizado, su histograma de caracteres, tokens y
+        # un índice invertido token -> tags para calcular las intersecciones.
+        unique_tags = {}
+        self._rows_by_tag: Dict[str, List[int]] = {}
+        for idx, row in enumerate(self.rows):
+            unique_tags[row["tag"]] = row
+            self._rows_by_tag.setdefault(row["tag"], []).append(idx)
+        self._tags = list(unique_tags)
+        self._tag_norm = [r["norm_tag"] for r in unique_tags.values()]
+        self._tag_chars = [Counter(n) for n in self._tag_norm]
+        self._tag_toks = [r["tok_tag"] for r in unique_tags.values()]
+        self._tag_postings: Dict[str, List[int]] = {}
+        for i, ts in enumerate(self._tag_toks):
+            for t in ts:
+                self._tag_postings.setdefault(t, []).append(i)
+
+    def _best_tag(self, q_norm:str, q_tokens:set)->Tuple[str, float]:
+        """Devuelve el TAG con mayor ``0.7 * ratio + 0.3 * jaccard`` y su puntaje.
+
+        El Jaccard de todos los tags sale del índice invertido en una pasada.
+        ``SequenceMatcher.ratio`` (lo caro) sólo se calcula para los tags cuya
+        cota superior (``real_quick_ratio`` y luego ``quick_ratio``) todavía
+        puede superar al mejor encontrado, así que el resultado -incluido el
+        desempate a favor del primer tag- es idéntico a recorrerlos todos.
+        """
+        n = len(self._tags)
+        inter = [0] * n
+        for t in q_tokens:
+            for i in self._tag_postings.get(t, ()):
+                inter[i] += 1
+
+        lq = len(q_norm)
+        nq = len(q_tokens)
+        candidatos = []
+        for i in range(n):
+            union = (nq + len(self._tag_toks[i]) - inter[i]) or 1
+            j = inter[i] / union
+            lt = len(self._tag_norm[i])
+            # real_quick_ratio: cota que sólo depende de las longitudes
+            rq = 2.0 * min(lq, lt) / (lq + lt) if lq + lt else 1.0
+            candidatos.append((0.7 * rq + 0.3 * j, i, j))
+        candidatos.sort(key=lambda c: (-c[0], c[1]))
+
+        q_chars = Counter(q_norm)
+        best_score, best_i = -1.0, -1
+        for cota, i, j in candidatos:
+            if cota < best_score or (cota == best_score and i > best_i):
+                break
+            lt = len(self._tag_norm[i])
+            # quick_ratio: cota por histograma de caracteres
+            comunes = sum(min(c, self._tag_chars[i][ch]) for ch, c in q_chars.items())
+            qr = 2.0 * comunes / (lq + lt) if lq + lt else 1.0
+            cota = 0.7 * qr + 0.3 * j
+            if cota < best_score or (cota == best_score and i > best_i):
+                continue
+            diff = SequenceMatcher(None, q_norm, self._tag_norm[i]).ratio()
+            score = 0.7 * diff + 0.3 * j
+            if score > best_score or (score == best_score and i < best_i):
+                best_score, best_i = score, i
+        if best_i < 0:
+            return "", -1.0
+        return self._tags[best_i], best_score
 
     def _score(self, query:str, q_tokens:Iterable[str])->float:
         return 0.0  # placeholder (se puntúa por fila abajo)
@@ -60,23 +156,7 @@ class RecommendationEngine:
             q_tokens_for_tag={t for t in q_tokens_for_tag if t not in cfg.stopwords}
 
         # Step 1: Find the best matching TAG
-        best_tag_score = -1.0
-        best_tag = ""
-        
-        unique_tags = {row["tag"]: row["tok_tag"] for row in self.rows}
-
-        for tag, tok_tag in unique_tags.items():
-            diff = SequenceMatcher(None, _norm(query), _norm(tag)).ratio()
-            
-            inter_tag = len(q_tokens_for_tag & tok_tag)
-            union_tag = len(q_tokens_for_tag | tok_tag) or 1
-            j_tag = inter_tag / union_tag
-            
-            tag_score = 0.7 * diff + 0.3 * j_tag
-            
-            if tag_score > best_tag_score:
-                best_tag_score = tag_score
-                best_tag = tag
+        best_tag, best_tag_score = self._best_tag(_norm(query), q_tokens_for_tag)
 
         TAG_MATCH_THRESHOLD = 0.35 
         if best_tag_score < TAG_MATCH_THRESHOLD:
@@ -87,28 +167,29 @@ class RecommendationEngine:
         if cfg.stopwords:
             q_tokens_for_obs={t for t in q_tokens_for_obs if t not in cfg.stopwords}
             
+        obs_text_for_diff = _norm(extra_text if extra_text else query)
         out = []
-        for row in self.rows:
-            if row["tag"] == best_tag:
-                if not row["obs"]:
-                    score = 0.1
-                else:
-                    inter_obs = len(q_tokens_for_obs & row["tok_obs"])
-                    union_obs = len(q_tokens_for_obs | row["tok_obs"]) or 1
-                    j_obs = inter_obs / union_obs
-
-                    obs_text_for_diff = extra_text if extra_text else query
-                    diff_obs = SequenceMatcher(None, _norm(obs_text_for_diff), _norm(row["obs"])).ratio()
-
-                    score = 0.6 * j_obs + 0.4 * diff_obs
-
-                if cfg.keyword_boost:
-                    for kw, bonus in cfg.keyword_boost.items():
-                        if kw in q_tokens_for_obs:
-                            score += bonus
-                
-                if row["rec"] and score >= min_score:
-                    out.append((score, row["rec"]))
+        # Sólo se recorren las filas del TAG elegido (índice tag -> filas)
+        for idx in self._rows_by_tag.get(best_tag, ()):
+            row = self.rows[idx]
+            if not row["obs"]:
+                score = 0.1
+            else:
+                inter_obs = len(q_tokens_for_obs & row["tok_obs"])
+                union_obs = len(q_tokens_for_obs | row["tok_obs"]) or 1
+                j_obs = inter_obs / union_obs
+
+                diff_obs = SequenceMatcher(None, obs_text_for_diff, row["norm_obs"]).ratio()
+
+                score = 0.6 * j_obs + 0.4 * diff_obs
+
+            if cfg.keyword_boost:
+                for kw, bonus in cfg.keyword_boost.items():
+                    if kw in q_tokens_for_obs:
+                        score += bonus
+            
+            if row["rec"] and score >= min_score:
+                out.append((score, row["rec"]))
 
         seen_recs = {}
         for score, rec in sorted(out, key=lambda x: x[0], reverse=True):
@@ -119,6 +200,104 @@ class RecommendationEngine:
 
         return [(s, r) for r, s in final_recs[:top_k]]
 
+    def suggest_many(self, queries:Iterable[Tuple[str, str]], top_k:int=None, min_score:float=None):
+        """Versión por lotes de ``suggest`` para una lista de ``(query, extra_text)``.
+
+        Retorna una lista de resultados alineada con ``queries``; las consultas
+        repetidas se resuelven una sola vez.
+        """
+        resultados: Dict[Tuple[str, str], list] = {}
+        out = []
+        for query, extra_text in queries:
+            key = (query, extra_text)
+            if key not in resultados:
+                resultados[key] = self.suggest(query, extra_text=extra_text, top_k=top_k, min_score=min_score)
+            out.append(list(resultados[key]))
+        return out
+
+# Caché de motores del proceso: (ruta, mtime, tamaño, config) -> motor ya construido
+_ENGINE_CACHE: Dict[tuple, RecommendationEngine] = {}
+_ENGINE_LOCK = threading.Lock()
+
+def _engine_key(csv_path:str, cfg:RecConfig)->tuple:
+    st = os.stat(csv_path)
+    return (os.path.abspath(csv_path), st.st_mtime_ns, st.st_size, repr(cfg))
+
+# Índice compilado que se guarda junto al CSV (``historico.csv.idx``) para
+# no tener que pasar por pandas ni re-tokenizar en cada arranque.
+_INDEX_VERSION = 1
+
+def _index_path(csv_path:str)->str:
+    return csv_path + ".idx"
+
+def _csv_digest(csv_path:str)->str:
+    with open(csv_path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+def _read_index(csv_path:str, digest:str)->List[HistRecord]|None:
+    """Registros del índice compilado, o None si no existe o no corresponde al CSV actual."""
+    try:
+        with open(_index_path(csv_path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != _INDEX_VERSION or data.get("csv_digest") != digest:
+        return None
+    return [tuple(r) for r in data.get("records", [])]
+
+def _write_index(csv_path:str, digest:str, records:List[HistRecord])->None:
+    """Guarda el índice compilado; si la carpeta es de solo lectura simplemente se omite."""
+    path = _index_path(csv_path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": _INDEX_VERSION, "csv_digest": digest, "records": records}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[WARN] No se pudo guardar el índice del histórico: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+def _load_records(csv_path:str)->List[HistRecord]:
+    digest = _csv_digest(csv_path)
+    records = _read_index(csv_path, digest)
+    if records is None:
+        import pandas as pd
+        df = pd.read_csv(csv_path, sep=";", encoding="latin1")
+        records = _compile_records(_df_records(df))
+        _write_index(csv_path, digest, records)
+    return records
+
 def load_engine(csv_path:str, cfg:RecConfig=RecConfig())->RecommendationEngine:
-    df = pd.read_csv(csv_path, sep=";", encoding="latin1")
-    return RecommendationEngine(df, cfg)
+    """Devuelve el motor para ``csv_path``, construyéndolo sólo si el archivo cambió."""
+    key = _engine_key(csv_path, cfg)
+    with _ENGINE_LOCK:
+        engine = _ENGINE_CACHE.get(key)
+        if engine is None:
+            engine = RecommendationEngine.from_records(_load_records(csv_path), cfg)
+            _store_engine(key, engine)
+        return engine
+
+def _store_engine(key:tuple, engine:RecommendationEngine)->None:
+    # Una sola versión por ruta: las entradas de un CSV ya modificado se descartan
+    for old in [k for k in _ENGINE_CACHE if k[0] == key[0]]:
+        del _ENGINE_CACHE[old]
+    _ENGINE_CACHE[key] = engine
+
+def prime_engine_cache(csv_path:str, engine:RecommendationEngine, cfg:RecConfig=RecConfig())->None:
+    """Registra un motor ya construido (p. ej. en los procesos del pool de ingesta)."""
+    key = _engine_key(csv_path, cfg)
+    with _ENGINE_LOCK:
+        _store_engine(key, engine)
+
+def clear_engine_cache(csv_path:str|None=None)->None:
+    """Olvida los motores en caché (todos, o sólo los de ``csv_path``)."""
+    with _ENGINE_LOCK:
+        if csv_path is None:
+            _ENGINE_CACHE.clear()
+            return
+        path = os.path.abspath(csv_path)
+        for old in [k for k in _ENGINE_CACHE if k[0] == path]:
+            del _ENGINE_CACHE[old]
@@ -0,0 +1,256 @@
+"""
+Fuentes de datos de un proyecto (ZIP o carpeta) con acceso perezoso.
+
+Las fuentes se comportan como un ``Mapping[str, bytes]`` de solo lectura
+(``ruta normalizada -> contenido``), igual que el diccionario que
+devolvían antes ``cargar_zip``/``cargar_directorio``, pero al crearse sólo
+construyen el índice de nombres. Los archivos de texto pequeños
+(``grupos.txt``, ``control_documents*``, ``infoproyect*.txt``...) se leen
+de inmediato; las fotos se descomprimen únicamente cuando alguien las pide
+y ``descriptions.txt`` se lee línea a línea con ``abrir``.
+
+Nota: ``items()``/``values()`` recorren y leen *todo* el contenido; para
+buscar un archivo concreto conviene iterar las claves y usar ``get``.
+"""
+import io
+import os
+import threading
+import zipfile
+from collections.abc import Mapping
+
+# Extensiones de foto que se indexan al recorrer una carpeta de proyecto
+EXTENSIONES_IMAGEN = (".jpg", ".jpeg", ".png")
+
+
+def es_archivo_texto(nombre: str) -> bool:
+    """Indica si ``nombre`` es uno de los archivos de texto que se leen de inmediato."""
+    base = os.path.basename(nombre).lower()
+    if base in ("descriptions.txt", "grupos.txt"):
+        return True
+    if base.startswith("control_documents"):
+        return True
+    return base.startswith("infoproyect") and base.endswith(".txt")
+
+
+def es_archivo_relevante(nombre: str) -> bool:
+    """Fotos y archivos de texto del proyecto; el resto (videos, respaldos...) se ignora."""
+    return nombre.lower().endswith(EXTENSIONES_IMAGEN) or es_archivo_texto(nombre)
+
+
+def construir_indice_basenames(claves) -> dict[str, list[str]]:
+    """Agrupa las rutas por nombre de archivo: ``basename -> [rutas]``."""
+    indice: dict[str, list[str]] = {}
+    for clave in claves:
+        indice.setdefault(os.path.basename(clave), []).append(clave)
+    return indice
+
+
+def abrir(archivos: Mapping, key: str):
+    """Abre ``key`` como flujo binario de lectura, sin cargarlo entero si la fuente lo permite."""
+    abrir_fuente = getattr(archivos, "open", None)
+    if abrir_fuente is not None:
+        return abrir_fuente(key)
+    return io.BytesIO(archivos[key])
+
+
+def indice_basenames(archivos: Mapping) -> dict[str, list[str]]:
+    """Índice ``basename -> [rutas]`` de ``archivos``.
+
+    Las fuentes de este módulo lo construyen una sola vez y lo reutilizan;
+    para un ``dict`` común se calcula en cada llamada.
+    """
+    indice = getattr(archivos, "basename_index", None)
+    if indice is None:
+        indice = construir_indice_basenames(archivos.keys())
+    return indice
+
+
+class _Source(Mapping):
+    """Base común de las fuentes: índice de basenames perezoso y ``close``."""
+
+    _basenames: dict[str, list[str]] | None = None
+
+    @property
+    def basename_index(self) -> dict[str, list[str]]:
+        if self._basenames is None:
+            self._basenames = construir_indice_basenames(self.keys())
+        return self._basenames
+
+    def close(self) -> None:
+        pass
+
+
+class ZipSource(_Source):
+    """Mapping ``ruta -> bytes`` respaldado por un archivo ZIP.
+
+    Sólo se guarda el índice de miembros; cada foto se descomprime al
+    pedirla. El ``ZipFile`` se abre bajo demanda y se reabre si el objeto
+    se usa desde otro proceso (p. ej. tras serializarlo con ``pickle``).
+    ``close`` lo libera (en Windows el ZIP queda bloqueado mientras está
+    abierto) sin inutilizar la fuente: la siguiente lectura lo reabre.
+    """
+
+    def __init__(self, path_zip: str):
+        self.path = path_zip
+        self._miembros: dict[str, str] = {}  # clave normalizada -> nombre real en el ZIP
+        self._textos: dict[str, bytes] = {}
+        self._zf = None
+        self._pid = None
+        self._lock = threading.Lock()
+        with zipfile.ZipFile(path_zip, "r") as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                # Normalizar separadores de ruta a '/' para consistencia
+                clave = info.filename.replace('\\', '/')
+                self._miembros[clave] = info.filename
+                # descriptions.txt puede ser grande: se lee en streaming con open()
+                if es_archivo_texto(clave) and os.path.basename(clave).lower() != "descriptions.txt":
+                    self._textos[clave] = zf.read(info)
+
+    def _archivo(self) -> zipfile.ZipFile:
+        if self._zf is None or self._pid != os.getpid():
+            self._zf = zipfile.ZipFile(self.path, "r")
+            self._pid = os.getpid()
+        return self._zf
+
+    def __getitem__(self, key: str) -> bytes:
+        if key in self._textos:
+            return self._textos[key]
+        miembro = self._miembros[key]
+        with self._lock:
+            return self._archivo().read(miembro)
+
+    def open(self, key: str):
+        if key in self._textos:
+            return io.BytesIO(self._textos[key])
+        miembro = self._miembros[key]
+        with self._lock:
+            return self._archivo().open(miembro)
+
+    def __contains__(self, key) -> bool:
+        return key in self._miembros
+
+    def __iter__(self):
+        return iter(self._miembros)
+
+    def __len__(self) -> int:
+        return len(self._miembros)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._zf is not None and self._pid == os.getpid():
+                self._zf.close()
+            self._zf = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_zf"] = None
+        state["_pid"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"ZipSource({self.path!r}, {len(self)} archivos)"
+
+
+class DirectorySource(_Source):
+    """Mapping ``ruta -> bytes`` respaldado por una carpeta de proyecto.
+
+    Al crearse sólo recorre el árbol y guarda ruta y tamaño de cada archivo
+    relevante (ver ``es_archivo_relevante``); ningún archivo se lee hasta que
+    se pide su contenido.
+    """
+
+    def __init__(self, path_dir: str):
+        self.path = os.path.abspath(path_dir)
+        self._archivos: dict[str, tuple[str, int]] = {}  # clave -> (ruta absoluta, tamaño)
+        self._escanear(self.path, "")
+
+    def _escanear(self, carpeta: str, prefijo: str) -> None:
+        with os.scandir(carpeta) as entradas:
+            for entrada in entradas:
+                # La clave es la ruta relativa al directorio base, usando '/' como separador
+                clave = prefijo + entrada.name
+                if entrada.is_dir():
+                    if not entrada.is_symlink():
+                        self._escanear(entrada.path, clave + "/")
+                elif entrada.is_file() and es_archivo_relevante(entrada.name):
+                    self._archivos[clave] = (entrada.path, entrada.stat().st_size)
+
+    def size(self, key: str) -> int:
+        """Tamaño en bytes registrado al escanear la carpeta."""
+        return self._archivos[key][1]
+
+    def __getitem__(self, key: str) -> bytes:
+        ruta, _ = self._archivos[key]
+        with open(ruta, "rb") as f:
+            return f.read()
+
+    def open(self, key: str):
+        return open(self._archivos[key][0], "rb")
+
+    def __contains__(self, key) -> bool:
+        return key in self._archivos
+
+    def __iter__(self):
+        return iter(self._archivos)
+
+    def __len__(self) -> int:
+        return len(self._archivos)
+
+    def __repr__(self) -> str:
+        return f"DirectorySource({self.path!r}, {len(self)} archivos)"
+
+
+class CombinedSource(_Source):
+    """Une varias fuentes en un único mapping.
+
+    ``update`` se comporta como ``dict.update``: si dos fuentes tienen la
+    misma ruta prevalece la última agregada. No se copia ningún contenido,
+    sólo se recuerda qué fuente responde por cada clave.
+    """
+
+    def __init__(self, *fuentes: Mapping):
+        self._fuentes: list[Mapping] = []
+        self._indice: dict[str, Mapping] = {}
+        for fuente in fuentes:
+            self.update(fuente)
+
+    def update(self, fuente: Mapping) -> None:
+        if isinstance(fuente, CombinedSource):
+            for f in fuente._fuentes:
+                self.update(f)
+            return
+        self._fuentes.append(fuente)
+        for clave in fuente.keys():
+            self._indice[clave] = fuente
+        self._basenames = None
+
+    def __getitem__(self, key: str) -> bytes:
+        return self._indice[key][key]
+
+    def open(self, key: str):
+        return abrir(self._indice[key], key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._indice
+
+    def __iter__(self):
+        return iter(self._indice)
+
+    def __len__(self) -> int:
+        return len(self._indice)
+
+    def close(self) -> None:
+        for fuente in self._fuentes:
+            cerrar = getattr(fuente, "close", None)
+            if cerrar:
+                cerrar()
+
+    def __repr__(self) -> str:
+        return f"CombinedSource({len(self._fuentes)} fuentes, {len(self)} archivos)"
@@ -1,49 +1,46 @@
 import sys
 import os
+import multiprocessing
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout,
-                             QPushButton, QFileDialog, QListWidget, QListWidgetItem,
+                             QPushButton, QFileDialog, QListView,
                              QMessageBox, QProgressDialog)
-from PyQt6.QtGui import QPixmap, QIcon
-from PyQt6.QtCore import QSize, Qt, QObject, QThread, pyqtSignal
-from app.core.processing import (cargar_zip, procesar_zip, reaplicar_recomendaciones, _find_image_data,
-                                 cargar_directorio)
-from app.report.pptx_writer import export_groups_to_pptx_report
-from app.report.xlsx_writer import export_groups_to_xlsx_report
-import re, json, csv, io
+from PyQt6.QtGui import QPixmap, QImage, QColor
+from PyQt6.QtCore import QSize, Qt, QObject, QThread, pyqtSignal, QAbstractListModel, QModelIndex
+from app.core.processing import (reaplicar_recomendaciones, _find_image_data, procesar_fuentes,
+                                 extraer_control_documents)
+from app.core.sources import CombinedSource
+from app.core.recommend import clear_engine_cache
+from app.report.plan import ReportPlan
+from app.report.pptx_writer import export_plan_to_pptx_report
+from app.report.xlsx_writer import export_plan_to_xlsx_report
+from app.utils.image_cache import CacheImagenes
+from app.utils.nlg_utils import CacheRedaccion
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Lado de las miniaturas de la lista de fotos, en píxeles
+ICONO_PX = 128
+# Memoria máxima para las miniaturas ya decodificadas de los grupos visitados
+MINIATURAS_MEMORIA_BYTES = 64 * 1024 * 1024
 
 class DataProcessorWorker(QObject):
-    finished = pyqtSignal(dict, dict, list)
+    finished = pyqtSignal(dict, object, list)
     progress = pyqtSignal(str)
 
-    def __init__(self, paths, hist_path, mode='zip'):
+    def __init__(self, paths, hist_path, mode='zip', max_workers=None):
         super().__init__()
         self.paths = paths
         self.hist_path = hist_path
         self.mode = mode
+        self.max_workers = max_workers
         self._is_running = True
 
     def run(self):
-        grupos_acumulados, archivos_acumulados, errors = {}, {}, []
-        
-        loader_func = cargar_zip if self.mode == 'zip' else cargar_directorio
-
-        for i, path in enumerate(self.paths):
-            if not self._is_running: break
-            try:
-                base_name = os.path.basename(path)
-                self.progress.emit(f"Procesando {i+1}/{len(self.paths)}: {base_name}...")
-                
-                # Usar la función de carga correspondiente
-                nuevos_archivos = loader_func(path)
-
-                archivos_acumulados.update(nuevos_archivos)
-                nuevos_grupos, error = procesar_zip(nuevos_archivos, hist_path=self.hist_path)
-                if error: errors.append(f"Error en {os.path.basename(path)}: {error}")
-                for key, grupo_nuevo in nuevos_grupos.items():
-                    if key in grupos_acumulados: grupos_acumulados[key].fotos.extend(grupo_nuevo.fotos)
-                    else: grupos_acumulados[key] = grupo_nuevo
-            except Exception as e:
-                errors.append(f"Error crítico procesando {base_name}: {e}")
+        # Cada origen se carga y procesa en su propio proceso; el resultado se
+        # combina en el orden en que se seleccionaron los archivos.
+        grupos_acumulados, archivos_acumulados, errors = procesar_fuentes(
+            self.paths, mode=self.mode, hist_path=self.hist_path, max_workers=self.max_workers,
+            progress_callback=self.progress, should_stop=lambda: not self._is_running)
         self.finished.emit(grupos_acumulados, archivos_acumulados, errors)
 
     def stop(self): self._is_running = False
@@ -52,123 +49,13 @@ class ReportWorker(QObject):
     finished = pyqtSignal(str)
     progress = pyqtSignal(int)
 
-    def __init__(self, report_type, grupos, archivos, destino):
+    def __init__(self, report_type, plan, destino):
         super().__init__()
         self.report_type = report_type
-        self.grupos = grupos
-        self.archivos = archivos
+        self.plan = plan
         self.destino = destino
         self._is_running = True
 
-    def _extract_control_documents(self):
-        """Busca un archivo llamado 'control_documents' en self.archivos y lo
-        convierte en un dict {numero:int -> situacion:str}. Acepta .json, .csv y .txt."""
-        try:
-            if not self.archivos:
-                return None
-            candidate = None
-            for path in self.archivos.keys():
-                base = os.path.basename(path).lower()
-                if base.startswith('control_documents'):
-                    candidate = path
-                    break
-            if not candidate:
-                return None
-            data = self.archivos.get(candidate)
-            if not data:
-                return None
-            base = os.path.basename(candidate).lower()
-            # JSON
-            if base.endswith('.json'):
-                try:
-                    obj = json.loads(data.decode('utf-8', errors='ignore'))
-                    res = {}
-                    if isinstance(obj, dict):
-                        for k, v in obj.items():
-                            try:
-                                res[int(k)] = '' if v is None else str(v)
-                            except Exception:
-                                pass
-                    elif isinstance(obj, list):
-                        for item in obj:
-                            if isinstance(item, dict):
-                                num = item.get('numero') or item.get('num') or item.get('id')
-                                if num is None:
-                                    continue
-                                try:
-                                    num = int(num)
-                                except Exception:
-                                    continue
-                                res[num] = str(item.get('situacion', ''))
-                    return res or None
-                except Exception:
-                    return None
-            # CSV
-            if base.endswith('.csv'):
-                try:
-                    text = data.decode('utf-8', errors='ignore')
-                    f = io.StringIO(text)
-                    sample = text[:1024]
-                    delimiter = ','
-                    if sample.count(';') > sample.count(','):
-                        delimiter = ';'
-                    elif '\t' in sample:
-                        delimiter = '\t'
-                    reader = csv.reader(f, delimiter=delimiter)
-                    headers = next(reader, None)
-                    res = {}
-                    for row in reader:
-                        if not row:
-                            continue
-                        num = None
-                        situacion = None
-                        if headers and any((h or '').lower().startswith('num') for h in headers):
-                            try:
-                                idx_num = next(i for i,h in enumerate(headers) if (h or '').lower().startswith('num'))
-                                num = int(row[idx_num])
-                            except Exception:
-                                continue
-                            try:
-                                idx_sit = next(i for i,h in enumerate(headers) if (h or '').lower().startswith('sit'))
-                                situacion = row[idx_sit]
-                            except Exception:
-                                situacion = row[-1] if row else ''
-                        else:
-                            for val in row:
-                                try:
-                                    num = int(val)
-                                    situacion = row[-1]
-                                    break
-                                except Exception:
-                                    continue
-                        if num is not None:
-                            res[num] = situacion or ''
-                    return res or None
-                except Exception:
-                    return None
-            # TXT u otros
-            try:
-                text = data.decode('utf-8', errors='ignore')
-            except Exception:
-                return None
-            res = {}
-            pattern = re.compile(r"(?ms)^\s*(\d{1,2})\b[\s\S]*?SITUACI[OÓ]N\s*:\s*(.+?)(?=^\s*\d{1,2}\b|\Z)", re.I)
-            for m in pattern.finditer(text):
-                try:
-                    num = int(m.group(1))
-                except Exception:
-                    continue
-                sit = m.group(2).strip()
-                res[num] = sit
-            if not res:
-                simple = re.compile(r"^\s*(\d{1,2})\s*[:.-]\s*(.+)$", re.M)
-                for m in simple.finditer(text):
-                    res[int(m.group(1))] = m.group(2).strip()
-            return res or None
-        except Exception:
-            return None
-
-
     def run(self):
         try:
             if not self._is_running: 
@@ -176,18 +63,215 @@ class ReportWorker(QObject):
                 return
 
             if self.report_type == 'xlsx':
-                control_docs = self._extract_control_documents()
-                export_groups_to_xlsx_report(self.grupos, self.archivos, self.destino, progress_callback=self.progress, control_documents=control_docs)
+                control_docs = extraer_control_documents(self.plan.archivos)
+                export_plan_to_xlsx_report(self.plan, self.destino, progress_callback=self.progress, control_documents=control_docs)
             elif self.report_type == 'pptx':
-                export_groups_to_pptx_report(self.grupos, self.archivos, self.destino, progress_callback=self.progress)
+                export_plan_to_pptx_report(self.plan, self.destino, progress_callback=self.progress)
             
             if self._is_running:
                 self.finished.emit(f"¡Informe guardado con éxito en:\n{self.destino}")
         except Exception as e:
             self.finished.emit(f"Ocurrió un error al generar el informe:\n{e}")
+        finally:
+            # Liberar los ZIPs (en Windows quedan bloqueados mientras están
+            # abiertos); se reabren solos si se vuelven a leer
+            self.plan.archivos.close()
 
     def stop(self): self._is_running = False
 
+def clave_miniatura(foto):
+    """Identifica la foto dentro de las fuentes cargadas."""
+    return foto.archive_key or f"{foto.carpeta}/{foto.filename}"
+
+class PixmapCache:
+    """Caché LRU de miniaturas ``QPixmap`` con un límite de memoria en bytes.
+
+    También recuerda las fotos que faltan o no se pudieron leer, para no
+    volver a pedirlas cada vez que se visita su grupo.
+    """
+
+    def __init__(self, limite_bytes=MINIATURAS_MEMORIA_BYTES):
+        self.limite_bytes = limite_bytes
+        self._pixmaps = OrderedDict()  # clave -> QPixmap, de menos a más reciente
+        self._total = 0
+        self._fallidas = set()
+
+    @staticmethod
+    def _tamano(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def get(self, clave):
+        pixmap = self._pixmaps.get(clave)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(clave)
+        return pixmap
+
+    def put(self, clave, pixmap):
+        anterior = self._pixmaps.pop(clave, None)
+        if anterior is not None:
+            self._total -= self._tamano(anterior)
+        self._pixmaps[clave] = pixmap
+        self._total += self._tamano(pixmap)
+        while self._total > self.limite_bytes and len(self._pixmaps) > 1:
+            _, viejo = self._pixmaps.popitem(last=False)
+            self._total -= self._tamano(viejo)
+
+    def marcar_fallida(self, clave):
+        self._fallidas.add(clave)
+
+    def fallida(self, clave):
+        return clave in self._fallidas
+
+    def clear(self):
+        self._pixmaps.clear()
+        self._total = 0
+        self._fallidas.clear()
+
+class ThumbnailLoader(QObject):
+    """Genera las miniaturas de la lista de fotos en un pool de hilos.
+
+    Cada pedido lleva el número de generación vigente al hacerlo; al elegir
+    otro grupo se llama a ``cancelar`` y los pedidos viejos que aún no
+    empezaron se descartan. Los resultados llegan al hilo de la interfaz a
+    través de la señal ``listo`` como ``QImage`` (``QPixmap`` sólo puede
+    crearse en el hilo principal); ``QImage()`` nulo si la foto falta o no
+    se pudo leer.
+    """
+    listo = pyqtSignal(int, int, QImage)  # generación, fila, imagen
+
+    def __init__(self, cache, max_workers=None):
+        super().__init__()
+        self.cache = cache
+        self.generacion = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1))
+        self._pendientes = set()  # pedidos sin terminar; cada uno se quita al completarse
+
+    def pedir(self, archivos, fila, foto):
+        """Encola la miniatura de ``foto``, que ocupa ``fila`` en la lista."""
+        futuro = self._pool.submit(self._miniatura, self.generacion, fila, archivos, foto)
+        self._pendientes.add(futuro)
+        futuro.add_done_callback(self._pendientes.discard)
+
+    def cancelar(self):
+        self.generacion += 1
+        for futuro in list(self._pendientes):
+            futuro.cancel()
+
+    def cerrar(self):
+        self.cancelar()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _miniatura(self, generacion, fila, archivos, foto):
+        if generacion != self.generacion:
+            return
+        imagen = QImage()
+        try:
+            img_data = _find_image_data(archivos, foto)
+            if img_data:
+                # Decodificar ya reducida al tamaño del ícono en vez de la foto completa
+                try:
+                    imagen.loadFromData(self.cache.preparar(img_data, ICONO_PX, ICONO_PX, quality=90).data)
+                except Exception:
+                    imagen.loadFromData(img_data)
+        except Exception as e:
+            print(f"Error generando miniatura {foto.filename}: {e}")
+        if generacion == self.generacion:
+            self.listo.emit(generacion, fila, imagen)
+
+class GruposModel(QAbstractListModel):
+    """Lista de grupos ordenada por clave; ``UserRole`` devuelve la clave."""
+
+    def __init__(self):
+        super().__init__()
+        self._filas = []  # (clave, cantidad de fotos)
+
+    def set_grupos(self, grupos):
+        self.beginResetModel()
+        self._filas = [(k, len(g.fotos)) for k, g in sorted(grupos.items())]
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._filas)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        k, n = self._filas[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{k} ({n} fotos)"
+        if role == Qt.ItemDataRole.UserRole:
+            return k
+        return None
+
+class FotosModel(QAbstractListModel):
+    """Fotos del grupo seleccionado.
+
+    Las miniaturas se piden recién cuando la vista consulta ``DecorationRole``,
+    es decir, sólo para las filas que se dibujan; mientras tanto se muestra
+    ``icono_pendiente``. Las ya decodificadas salen de ``pixmaps`` y las que
+    ``pixmaps`` marca como fallidas no se vuelven a pedir. Si ``pixmaps``
+    descartó una miniatura para liberar memoria, se pide de nuevo.
+    """
+
+    def __init__(self, miniaturas, pixmaps, icono_pendiente):
+        super().__init__()
+        self.miniaturas = miniaturas
+        self.pixmaps = pixmaps
+        self.icono_pendiente = icono_pendiente
+        self.archivos = None
+        self._fotos = []
+        self._pedidas = {}  # clave_miniatura -> filas que esperan esa miniatura
+
+    def set_fotos(self, fotos, archivos):
+        self.beginResetModel()
+        self.miniaturas.cancelar()
+        self._fotos = list(fotos)
+        self.archivos = archivos
+        self._pedidas = {}
+        self.endResetModel()
+
+    def set_miniatura(self, fila, pixmap):
+        clave = clave_miniatura(self._fotos[fila])
+        self.pixmaps.put(clave, pixmap)
+        for f in self._pedidas.pop(clave, {fila}):
+            index = self.index(f)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def marcar_fallida(self, fila):
+        """Registra la falla y devuelve las filas de esa foto (la misma foto puede repetirse)."""
+        clave = clave_miniatura(self._fotos[fila])
+        self.pixmaps.marcar_fallida(clave)
+        return self._pedidas.pop(clave, {fila})
+
+    def filas_fallidas(self):
+        return [fila for fila, foto in enumerate(self._fotos) if self.pixmaps.fallida(clave_miniatura(foto))]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._fotos)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        fila = index.row()
+        foto = self._fotos[fila]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return foto.filename
+        if role == Qt.ItemDataRole.DecorationRole:
+            clave = clave_miniatura(foto)
+            pixmap = self.pixmaps.get(clave)
+            if pixmap is not None:
+                return pixmap
+            if self.pixmaps.fallida(clave):
+                return self.icono_pendiente
+            filas = self._pedidas.get(clave)
+            if filas is None:
+                self._pedidas[clave] = {fila}
+                self.miniaturas.pedir(self.archivos, fila, foto)
+            else:
+                filas.add(fila)
+            return self.icono_pendiente
+        return None
+
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
@@ -195,6 +279,19 @@ class MainWindow(QWidget):
         self.resize(900, 600)
         self.thread = None
         self.worker = None
+        # Fotos ya reducidas, compartidas entre las miniaturas y los informes
+        self.cache_imagenes = CacheImagenes()
+        self.miniaturas = ThumbnailLoader(self.cache_imagenes)
+        # Agrupamientos de descripciones ya redactados, compartidos entre informes
+        self.cache_nlg = CacheRedaccion()
+        # Plan de los informes de los grupos cargados; se arma con el primer informe
+        self.plan = None
+        self.miniaturas.listo.connect(self.on_miniatura_lista)
+        self.icono_pendiente = QPixmap(ICONO_PX, ICONO_PX)
+        self.icono_pendiente.fill(QColor("#e0e0e0"))
+        self.pixmaps = PixmapCache()
+        self.modelo_grupos = GruposModel()
+        self.modelo_fotos = FotosModel(self.miniaturas, self.pixmaps, self.icono_pendiente)
 
         # --- Widgets ---
         self.btnZip = QPushButton("Cargar ZIP(s)")
@@ -203,12 +300,19 @@ class MainWindow(QWidget):
         self.btnPptReport = QPushButton("Generar Informe A4 (PPTX)")
         self.btnXlsxReport = QPushButton("Generar Informe (XLSX)")
         self.btnHist = QPushButton("Cargar historico.csv (opcional)")
-        self.lista = QListWidget()
-        self.listaFotos = QListWidget()
-        self.listaFotos.setViewMode(QListWidget.ViewMode.IconMode)
-        self.listaFotos.setIconSize(QSize(128, 128))
-        self.listaFotos.setResizeMode(QListWidget.ResizeMode.Adjust)
+        self.lista = QListView()
+        self.lista.setModel(self.modelo_grupos)
+        self.listaFotos = QListView()
+        self.listaFotos.setModel(self.modelo_fotos)
+        self.listaFotos.setViewMode(QListView.ViewMode.IconMode)
+        self.listaFotos.setMovement(QListView.Movement.Static)
+        self.listaFotos.setIconSize(QSize(ICONO_PX, ICONO_PX))
+        self.listaFotos.setResizeMode(QListView.ResizeMode.Adjust)
         self.listaFotos.setWordWrap(True)
+        # Con tamaños uniformes la vista no consulta cada fila para medirla,
+        # así que sólo se piden las miniaturas de las filas visibles
+        self.listaFotos.setUniformItemSizes(True)
+        self.listaFotos.setLayoutMode(QListView.LayoutMode.Batched)
 
         # --- Layouts ---
         main_layout = QVBoxLayout(self)
@@ -234,7 +338,7 @@ class MainWindow(QWidget):
         self.btnHist.clicked.connect(self.on_cargar_hist)
         self.btnPptReport.clicked.connect(lambda: self.generar_informe('pptx'))
         self.btnXlsxReport.clicked.connect(lambda: self.generar_informe('xlsx'))
-        self.lista.currentItemChanged.connect(self.on_grupo_seleccionado)
+        self.lista.selectionModel().currentChanged.connect(self.on_grupo_seleccionado)
 
         self.on_limpiar()
 
@@ -251,9 +355,14 @@ class MainWindow(QWidget):
         if self.thread and self.thread.isRunning():
             QMessageBox.warning(self, "Aviso", "No se puede limpiar mientras se procesan archivos.")
             return
-        self.grupos, self.archivos, self.hist_path = {}, {}, None
-        self.lista.clear()
-        self.listaFotos.clear()
+        self.modelo_fotos.set_fotos([], None)
+        self.pixmaps.clear()
+        self.cache_nlg.clear()
+        self.plan = None
+        if getattr(self, "archivos", None) is not None:
+            self.archivos.close()
+        self.grupos, self.archivos, self.hist_path = {}, CombinedSource(), None
+        self.modelo_grupos.set_grupos(self.grupos)
 
     def on_cargar_zip(self):
         if self.thread and self.thread.isRunning(): return
@@ -290,6 +399,11 @@ class MainWindow(QWidget):
 
     def on_processing_finished(self, nuevos_grupos, nuevos_archivos, errors):
         self.archivos.update(nuevos_archivos)
+        # La ingesta pudo dejar abiertos los ZIPs; se reabren al pedir una foto
+        self.archivos.close()
+        # Las nuevas fuentes pueden reemplazar rutas ya cargadas
+        self.pixmaps.clear()
+        self.plan = None
         for key, grupo_nuevo in nuevos_grupos.items():
             if key in self.grupos: self.grupos[key].fotos.extend(grupo_nuevo.fotos)
             else: self.grupos[key] = grupo_nuevo
@@ -314,7 +428,9 @@ class MainWindow(QWidget):
         progress.setWindowModality(Qt.WindowModality.WindowModal)
         
         self.thread = QThread()
-        self.worker = ReportWorker(report_type, self.grupos, self.archivos, destino)
+        if self.plan is None:
+            self.plan = ReportPlan(self.grupos, self.archivos, cache=self.cache_imagenes, nlg=self.cache_nlg)
+        self.worker = ReportWorker(report_type, self.plan, destino)
         self.worker.moveToThread(self.thread)
         self.worker.progress.connect(progress.setValue)
         progress.canceled.connect(self.worker.stop)
@@ -335,28 +451,27 @@ class MainWindow(QWidget):
         self.thread = None
 
     def actualizar_lista_grupos(self):
-        self.lista.clear()
-        self.listaFotos.clear()
-        for k, g in sorted(self.grupos.items()):
-            item = QListWidgetItem(f"{k} ({len(g.fotos)} fotos)")
-            item.setData(Qt.ItemDataRole.UserRole, k)
-            self.lista.addItem(item)
+        self.modelo_fotos.set_fotos([], None)
+        self.modelo_grupos.set_grupos(self.grupos)
 
     def on_grupo_seleccionado(self, current, previous):
-        self.listaFotos.clear()
-        if not current: return
-        key = current.data(Qt.ItemDataRole.UserRole)
-        if key not in self.grupos: return
-        grupo = self.grupos[key]
-        for foto in grupo.fotos:
-            img_data = _find_image_data(self.archivos, foto)
-            if img_data:
-                pixmap = QPixmap()
-                pixmap.loadFromData(img_data)
-                if not pixmap.isNull():
-                    item = QListWidgetItem(foto.filename)
-                    item.setIcon(QIcon(pixmap))
-                    self.listaFotos.addItem(item)
+        key = current.data(Qt.ItemDataRole.UserRole) if current.isValid() else None
+        if key not in self.grupos:
+            self.modelo_fotos.set_fotos([], None)
+            return
+        self.modelo_fotos.set_fotos(self.grupos[key].fotos, self.archivos)
+        # Las fotos que ya fallaron en otra visita se ocultan sin volver a pedirlas
+        for fila in self.modelo_fotos.filas_fallidas():
+            self.listaFotos.setRowHidden(fila, True)
+
+    def on_miniatura_lista(self, generacion, fila, imagen):
+        if generacion != self.miniaturas.generacion: return
+        if imagen.isNull():
+            # Como antes: las fotos que faltan o no se pueden leer no se muestran
+            for f in self.modelo_fotos.marcar_fallida(fila):
+                self.listaFotos.setRowHidden(f, True)
+        else:
+            self.modelo_fotos.set_miniatura(fila, QPixmap.fromImage(imagen))
 
     def on_cargar_hist(self):
         if self.thread and self.thread.isRunning():
@@ -365,12 +480,15 @@ class MainWindow(QWidget):
         path, _ = QFileDialog.getOpenFileName(self, "Selecciona historico.csv", "", "CSV (*.csv)")
         if not path: return
         self.hist_path = path
+        # El archivo elegido pudo cambiar desde la última vez: reconstruir el motor
+        clear_engine_cache()
         QMessageBox.information(self, "Histórico Cargado", f"Se usará el archivo:\n{path}")
         if self.grupos:
             reply = QMessageBox.question(self, 'Aplicar Histórico', "¿Deseas aplicar las recomendaciones a los datos ya cargados?",
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.Yes)
             if reply == QMessageBox.StandardButton.Yes:
                 error = reaplicar_recomendaciones(self.grupos, self.hist_path)
+                self.plan = None  # el texto de recomendaciones del plan quedó viejo
                 if error: QMessageBox.critical(self, "Error al Aplicar Histórico", f"No se pudieron aplicar las recomendaciones.\n\nError: {error}")
                 else: QMessageBox.information(self, "Éxito", "Se han actualizado las recomendaciones.")
 
@@ -379,6 +497,8 @@ class MainWindow(QWidget):
             self.worker.stop()
             self.thread.quit()
             self.thread.wait(500)
+        self.miniaturas.cerrar()
+        self.archivos.close()
         event.accept()
 
 def main():
@@ -388,4 +508,6 @@ def main():
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    # Necesario para el pool de procesos de la ingesta en el .exe de PyInstaller
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,158 @@
+"""
+plan.py
+=================
+
+Contenido común de los informes PPTX y XLSX, calculado una sola vez.
+
+Los dos informes muestran lo mismo con distinto diseño: por cada grupo,
+sus fotos repartidas en páginas, las oraciones de "UBICACIÓN Y DETALLE"
+redactadas a partir de los detalles de las fotos y el texto de las
+recomendaciones. ``ReportPlan`` arma esas piezas para un proyecto (el
+orden natural de los grupos, la paginación de cada tamaño de página, los
+textos y las fotos preparadas) y los escritores sólo las dibujan.
+
+Las fotos se entregan ya preparadas en el formato de cada informe. Si se
+van a generar ambos, ``preparar_imagenes`` las prepara antes en todos los
+formatos de una vez: cada foto se lee del origen una sola vez y se
+decodifica lo menos posible (``preparar_variantes``). Los resultados
+quedan en la caché en disco, donde los encuentran después los escritores.
+
+Uso ejemplo:
+
+.. code-block:: python
+
+    plan = ReportPlan(grupos, archivos, cache=CacheImagenes())
+    plan.preparar_imagenes([FORMATO_PPTX, FORMATO_XLSX])
+    export_plan_to_pptx_report(plan, "informe.pptx")
+    export_plan_to_xlsx_report(plan, "informe.xlsx")
+    plan.close()
+"""
+
+import re
+import sys
+import tempfile
+import zipfile
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Mapping, Sequence
+
+from app.core.processing import Foto, Grupo, _find_image_data
+from app.utils.image_cache import CacheImagenes
+from app.utils.image_utils import Formato, Resultado, preparar_en_paralelo, preparar_variantes_en_paralelo
+from app.utils.nlg_utils import CacheRedaccion, agrupa_y_redacta
+
+
+def clave_orden_natural(nombre: str) -> list:
+    """Clave para ordenar nombres con números como los lee una persona (2 antes que 10)."""
+    return [int(text) if text.isdigit() else text.lower() for text in re.split('([0-9]+)', nombre)]
+
+
+@dataclass
+class FotoPlan:
+    """Una foto del informe y su número dentro del grupo (desde 1)."""
+
+    foto: Foto
+    numero: int
+
+
+class GrupoPlan:
+    """Un grupo del informe con sus fotos numeradas y sus textos."""
+
+    def __init__(self, nombre: str, grupo: Grupo):
+        self.nombre = nombre
+        self.grupo = grupo
+        self.fotos = [FotoPlan(foto, i) for i, foto in enumerate(grupo.fotos, start=1)]
+        recs = getattr(grupo, "recomendaciones", None) or []
+        self.texto_recomendaciones = "\n".join(f"• {r}" for r in recs) if recs else "—"
+        self._paginas: Dict[int, List[List[FotoPlan]]] = {}
+
+    def paginas(self, por_pagina: int) -> List[List[FotoPlan]]:
+        """Fotos repartidas en páginas de ``por_pagina`` (ninguna si el grupo no tiene fotos)."""
+        paginas = self._paginas.get(por_pagina)
+        if paginas is None:
+            paginas = [self.fotos[i:i + por_pagina] for i in range(0, len(self.fotos), por_pagina)]
+            self._paginas[por_pagina] = paginas
+        return paginas
+
+
+class ReportPlan:
+    """Grupos, páginas, textos y fotos de un proyecto, listos para dibujar.
+
+    Args:
+        grupos: Grupos del proyecto, en el orden del procesamiento.
+        archivos: Origen de datos de las fotos.
+        cache: Caché en disco de fotos preparadas (opcional).
+        nlg: Caché de agrupamientos de descripciones; por defecto, una
+            nueva para este plan.
+        umbral_similitud: Umbral de ``agrupa_y_redacta``.
+    """
+
+    def __init__(self, grupos: Dict[str, Grupo], archivos: Mapping[str, bytes],
+                 cache: CacheImagenes | None = None, nlg: CacheRedaccion | None = None,
+                 umbral_similitud: float = 0.8):
+        self.archivos = archivos
+        self.cache = cache
+        self.nlg = nlg if nlg is not None else CacheRedaccion()
+        self.umbral_similitud = umbral_similitud
+        self.grupos = [GrupoPlan(nombre, grupo) for nombre, grupo in grupos.items()]
+        self._orden_natural: List[GrupoPlan] | None = None
+        self._tmp: tempfile.TemporaryDirectory | None = None
+
+    def en_orden_natural(self) -> List[GrupoPlan]:
+        if self._orden_natural is None:
+            self._orden_natural = sorted(self.grupos, key=lambda g: clave_orden_natural(g.nombre))
+        return self._orden_natural
+
+    def oraciones(self, fotos: Sequence[FotoPlan], numerar: bool = False) -> List[str]:
+        """Oraciones de "UBICACIÓN Y DETALLE" para ``fotos``.
+
+        Cada ubicación es la carpeta de la foto, seguida de ``[Foto n]`` si
+        ``numerar``.
+        """
+        entradas = [
+            (fp.foto.detalle, f"{fp.foto.carpeta} [Foto {fp.numero}]" if numerar else fp.foto.carpeta)
+            for fp in fotos
+        ]
+        return agrupa_y_redacta(entradas, umbral_similitud=self.umbral_similitud, cache=self.nlg)
+
+    def _datos(self, grupos: Iterable[GrupoPlan]) -> Iterator[bytes | Exception | None]:
+        """Bytes de cada foto de ``grupos``, o la excepción si no se pudo leer del origen.
+
+        Las fotos se leen recién aquí, así que un miembro dañado del ZIP se
+        informa como error de esa foto en lugar de cortar el informe.
+        """
+        for grupo in grupos:
+            for fp in grupo.fotos:
+                try:
+                    datos = _find_image_data(self.archivos, fp.foto)
+                except (zipfile.BadZipFile, zlib.error, EOFError, OSError, KeyError) as e:
+                    datos = e
+                yield datos
+
+    def imagenes(self, grupos: Iterable[GrupoPlan], formato: Formato,
+                 max_workers: int | None = None) -> Iterator[Resultado]:
+        """``(imagen, error)`` de cada foto de ``grupos``, en orden, preparada en ``formato``."""
+        max_w, max_h, quality = formato
+        return preparar_en_paralelo(self._datos(grupos), max_w, max_h, quality=quality,
+                                    max_workers=max_workers, cache=self.cache)
+
+    def preparar_imagenes(self, formatos: Sequence[Formato], max_workers: int | None = None) -> None:
+        """Deja todas las fotos preparadas en cada uno de ``formatos``.
+
+        Si el plan no tiene caché, usa una temporal (sin límite de tamaño)
+        que se borra con ``close``. Las fotos que fallen se vuelven a
+        intentar (y se informan) al generar cada informe.
+        """
+        if self.cache is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="inspectw_plan_")
+            self.cache = CacheImagenes(self._tmp.name, limite_bytes=sys.maxsize)
+        for _ in preparar_variantes_en_paralelo(self._datos(self.grupos), formatos,
+                                                max_workers=max_workers, cache=self.cache):
+            pass
+
+    def close(self) -> None:
+        """Borra la caché temporal de ``preparar_imagenes``, si se creó una."""
+        if self._tmp is not None:
+            self._tmp.cleanup()
+            self._tmp = None
+            self.cache = None
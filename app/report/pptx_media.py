@@ -0,0 +1,132 @@
+"""
+pptx_media.py
+=================
+
+Imágenes de python-pptx guardadas en archivos temporales en lugar de en
+memoria.
+
+python-pptx mantiene el contenido de cada imagen insertada dentro de su
+``ImagePart`` hasta ``Presentation.save``; en informes con miles de fotos
+eso son varios GB. ``usar_imagenes_en_disco`` hace que cada imagen nueva se
+escriba a una carpeta temporal apenas se inserta y que la parte sólo la
+vuelva a leer al guardar el paquete, de a una por vez.
+
+Además, la búsqueda de imágenes repetidas usa un diccionario por SHA1 en
+vez de recorrer todas las partes del paquete en cada inserción.
+
+Para esto se reemplazan piezas internas de python-pptx (``_ImageParts`` y
+la ``lazyproperty`` ``_image_parts`` del paquete), así que
+``requirements.txt`` fija la versión con la que se probó.
+
+Uso ejemplo:
+
+.. code-block:: python
+
+    medios = usar_imagenes_en_disco(prs)
+    slide.shapes.add_picture(io.BytesIO(jpeg), left, top, width, height)
+    prs.save(destino)
+    medios.close()
+"""
+
+import os
+import tempfile
+
+from pptx.opc.packuri import PackURI
+from pptx.package import _ImageParts
+from pptx.parts.image import Image, ImagePart
+
+
+class ImagePartEnDisco(ImagePart):
+    """``ImagePart`` cuyo contenido se lee de ``ruta`` sólo cuando se necesita.
+
+    El SHA1, el tamaño en píxeles y los DPI se calculan una vez al crearla,
+    así que insertar la imagen no obliga a releer el archivo.
+    """
+
+    def __init__(self, partname, content_type, package, ruta, sha1, px_size, dpi, filename=None):
+        super().__init__(partname, content_type, package, b"", filename)
+        self._ruta = ruta
+        self._sha1 = sha1
+        self._px_size_guardado = px_size
+        self._dpi_guardado = dpi
+
+    @property
+    def blob(self) -> bytes:
+        with open(self._ruta, "rb") as f:
+            return f.read()
+
+    @property
+    def image(self) -> Image:
+        return Image(self.blob, self.desc)
+
+    @property
+    def sha1(self) -> str:
+        return self._sha1
+
+    @property
+    def _dpi(self) -> tuple[int, int]:
+        return self._dpi_guardado
+
+    @property
+    def _px_size(self) -> tuple[int, int]:
+        return self._px_size_guardado
+
+
+class ImagenesEnDisco(_ImageParts):
+    """Reemplazo de ``_ImageParts`` de un paquete que crea ``ImagePartEnDisco``.
+
+    Los archivos viven en un ``TemporaryDirectory`` que se borra con
+    ``close`` (o, si no se llama, cuando el objeto se libera).
+    """
+
+    def __init__(self, package, directorio: str | None = None):
+        super().__init__(package)
+        self._tmp = tempfile.TemporaryDirectory(prefix="inspectw_pptx_", dir=directorio)
+        # Imágenes que el paquete ya tuviera (p. ej. en la plantilla)
+        self._por_sha1 = {parte.sha1: parte for parte in self if hasattr(parte, "sha1")}
+        self._siguiente: int | None = None
+
+    def get_or_add_image_part(self, image_file) -> ImagePart:
+        image = Image.from_file(image_file)
+        parte = self._por_sha1.get(image.sha1)
+        if parte is None:
+            parte = self._nueva_parte(image)
+            self._por_sha1[image.sha1] = parte
+        return parte
+
+    def _nueva_parte(self, image: Image) -> ImagePartEnDisco:
+        # Mismos nombres que asignaría python-pptx (image1, image2...), pero sin
+        # recorrer todas las partes del paquete en cada imagen
+        if self._siguiente is None:
+            self._siguiente = self._package.next_image_partname(image.ext).idx
+        partname = PackURI(f"/ppt/media/image{self._siguiente}.{image.ext}")
+        self._siguiente += 1
+
+        ruta = os.path.join(self._tmp.name, partname.filename)
+        with open(ruta, "wb") as f:
+            f.write(image.blob)
+        return ImagePartEnDisco(partname, image.content_type, self._package, ruta,
+                                image.sha1, image.size, image.dpi, image.filename)
+
+    def close(self) -> None:
+        """Borra los archivos temporales; llamar después de ``Presentation.save``."""
+        self._tmp.cleanup()
+
+
+def usar_imagenes_en_disco(prs, directorio: str | None = None) -> ImagenesEnDisco:
+    """Hace que las imágenes que se inserten en ``prs`` se guarden en disco.
+
+    Args:
+        prs: ``Presentation`` de python-pptx.
+        directorio: Carpeta donde crear la carpeta temporal; por defecto la
+            del sistema.
+
+    Returns:
+        El objeto que administra las imágenes, para cerrarlo tras guardar.
+    """
+    package = prs.part.package
+    medios = ImagenesEnDisco(package, directorio)
+    # ``_image_parts`` es una lazyproperty: el valor guardado en la instancia
+    # tiene prioridad sobre el que calcularía python-pptx
+    package.__dict__["_image_parts"] = medios
+    return medios
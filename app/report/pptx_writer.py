@@ -3,11 +3,17 @@ from pptx.util import Inches, Pt
 from pptx.enum.shapes import MSO_SHAPE
 from pptx.enum.text import MSO_AUTO_SIZE
 from pptx.dml.color import RGBColor
-from PIL import Image, ImageOps
-import io, math
-from typing import Dict
-from app.core.processing import Grupo, Foto
-from app.utils.nlg_utils import agrupa_y_redacta
+import io
+from typing import Dict, Mapping
+from app.core.processing import Grupo
+from app.utils.nlg_utils import CacheRedaccion
+from app.utils.image_cache import CacheImagenes
+from app.report.pptx_media import usar_imagenes_en_disco
+from app.report.plan import ReportPlan
+
+# Tamaño máximo (px) y calidad JPEG de las fotos del PPTX
+MAX_PX = 1600
+FORMATO_PPTX = (MAX_PX, MAX_PX, 80)
 
 def _add_textbox(slide, left, top, width, height, text, size=11):
     tb = slide.shapes.add_textbox(left, top, width, height)
@@ -19,202 +25,189 @@ def _add_textbox(slide, left, top, width, height, text, size=11):
     run.font.size = Pt(size)
     return tb
 
-def export_groups_to_pptx_report(grupos: Dict[str, Grupo], archivos: Dict[str, bytes],
-                                 output_pptx_path: str, max_px: int = 1600, progress_callback=None) -> None:
+def export_groups_to_pptx_report(grupos: Dict[str, Grupo], archivos: Mapping[str, bytes],
+                                 output_pptx_path: str, max_px: int = MAX_PX, progress_callback=None,
+                                 max_workers: int | None = None, cache: CacheImagenes | None = None,
+                                 low_memory: bool = False, nlg: CacheRedaccion | None = None) -> None:
+    """Genera el informe PPTX A4 de ``grupos``.
+
+    Arma un ``ReportPlan`` y lo dibuja con ``export_plan_to_pptx_report``.
+    ``nlg`` es la caché de agrupamientos de descripciones del proyecto,
+    compartida con el XLSX y con exportaciones anteriores.
+    """
+    plan = ReportPlan(grupos, archivos, cache=cache, nlg=nlg)
+    export_plan_to_pptx_report(plan, output_pptx_path, max_px=max_px, progress_callback=progress_callback,
+                               max_workers=max_workers, low_memory=low_memory)
+
+def export_plan_to_pptx_report(plan: ReportPlan, output_pptx_path: str, max_px: int = MAX_PX,
+                               progress_callback=None, max_workers: int | None = None,
+                               low_memory: bool = False) -> None:
+    """Dibuja el informe PPTX A4 de ``plan``: 12 fotos por diapositiva.
+
+    Con ``low_memory`` las fotos insertadas se guardan en archivos
+    temporales hasta ``save`` en lugar de mantenerse en memoria, de modo que
+    el consumo no crece con la cantidad de fotos del informe.
+    """
     prs = Presentation()
-    prs.slide_width = Inches(8.27)
-    prs.slide_height = Inches(11.69)
-    blank_layout = prs.slide_layouts[6]
-
-    cols, rows = 4, 3
-    margin_x = 0.4
-    margin_y_top = 1.2
-    margin_y_bottom = 0.4
-    enumerated_h = 2.5
-    spacing_x = 0.1
-    spacing_y = 0.1
-
-    slide_w_in = prs.slide_width / 914400.0
-    slide_h_in = prs.slide_height / 914400.0
-    photo_area_h = slide_h_in - margin_y_top - enumerated_h - margin_y_bottom
-    cell_w = (slide_w_in - 2 * margin_x - (cols - 1) * spacing_x) / cols
-    cell_h = (photo_area_h - (rows - 1) * spacing_y) / rows
-
-    # Calcular el número total de diapositivas para el progreso
-    total_slides = sum(math.ceil(len(g.fotos) / (cols * rows)) for g in grupos.values() if g.fotos)
-    slides_done = 0
-
-    for gname, grupo in grupos.items():
+    medios = usar_imagenes_en_disco(prs) if low_memory else None
+    try:
+        prs.slide_width = Inches(8.27)
+        prs.slide_height = Inches(11.69)
+        blank_layout = prs.slide_layouts[6]
+
+        cols, rows = 4, 3
+        margin_x = 0.4
+        margin_y_top = 1.2
+        margin_y_bottom = 0.4
+        enumerated_h = 2.5
+        spacing_x = 0.1
+        spacing_y = 0.1
+
+        slide_w_in = prs.slide_width / 914400.0
+        slide_h_in = prs.slide_height / 914400.0
+        photo_area_h = slide_h_in - margin_y_top - enumerated_h - margin_y_bottom
+        cell_w = (slide_w_in - 2 * margin_x - (cols - 1) * spacing_x) / cols
+        cell_h = (photo_area_h - (rows - 1) * spacing_y) / rows
+
+        # Calcular el número total de diapositivas para el progreso
         per_slide = cols * rows
-        total = len(grupo.fotos)
-        pages = math.ceil(total / per_slide) if per_slide else 0
-
-        for page in range(pages):
-            slide = prs.slides.add_slide(blank_layout)
-
-            # --- INICIO DE LA CORRECCIÓN AVANZADA DE TÍTULO ---
-            title_box = slide.shapes.add_textbox(
-                Inches(margin_x), Inches(0.3),
-                Inches(slide_w_in - 2 * margin_x), Inches(0.75) # Mantener altura aumentada
-            )
-            tf = title_box.text_frame
-            # 1. Activar autoajuste para que el texto se reduzca para caber
-            tf.auto_size = MSO_AUTO_SIZE.TEXT_TO_FIT_SHAPE
-            # 2. Asegurar que el texto se divida en varias líneas
-            tf.word_wrap = True
+        total_slides = sum(len(g.paginas(per_slide)) for g in plan.grupos)
+        slides_done = 0
+
+        # Las fotos se decodifican y reducen en un pool de procesos, en el mismo
+        # orden en que el bucle de diapositivas las va a insertar.
+        imagenes = plan.imagenes(plan.grupos, (max_px, max_px, FORMATO_PPTX[2]), max_workers=max_workers)
+
+        for gplan in plan.grupos:
+            for chunk in gplan.paginas(per_slide):
+                slide = prs.slides.add_slide(blank_layout)
+
+                # --- INICIO DE LA CORRECCIÓN AVANZADA DE TÍTULO ---
+                title_box = slide.shapes.add_textbox(
+                    Inches(margin_x), Inches(0.3),
+                    Inches(slide_w_in - 2 * margin_x), Inches(0.75) # Mantener altura aumentada
+                )
+                tf = title_box.text_frame
+                # 1. Activar autoajuste para que el texto se reduzca para caber
+                tf.auto_size = MSO_AUTO_SIZE.TEXT_TO_FIT_SHAPE
+                # 2. Asegurar que el texto se divida en varias líneas
+                tf.word_wrap = True
             
-            p_title = tf.paragraphs[0]
-            p_title.text = gname
-            # 3. Establecer un tamaño de fuente INICIAL grande. Autoajuste lo reducirá si es necesario.
-            p_title.font.size = Pt(16)
-            # --- FIN DE LA CORRECCIÓN AVANZADA DE TÍTULO ---
-
-            label_y = margin_y_top - 0.3
-            label_box = slide.shapes.add_textbox(
-                Inches(margin_x), Inches(label_y),
-                Inches(3), Inches(0.4)
-            )
-            p_label = label_box.text_frame.paragraphs[0]
-            p_label.text = "FOTOGRAFÍAS:"
-            if p_label.runs:
-                run_label = p_label.runs[0]
-                run_label.font.bold = True
-                run_label.font.size = Pt(12)
-
-            chunk = grupo.fotos[page * per_slide:(page + 1) * per_slide]
-            for idx, foto in enumerate(chunk):
-                r = idx // cols
-                c = idx % cols
-                x = margin_x + c * (cell_w + spacing_x)
-                y = margin_y_top + r * (cell_h + spacing_y)
-
-                # Intentar diferentes variaciones de la ruta
-                posible_paths = [
-                    f"{foto.carpeta}/{foto.filename}",  # Unix style
-                    f"{foto.carpeta}\\{foto.filename}",  # Windows style
-                    foto.filename,  # Solo nombre del archivo
-                    f"{foto.carpeta.replace('/', '\\')}\\{foto.filename}"  # Windows style con carpeta normalizada
-                ]
-                
-                img_data = None
-                for path in posible_paths:
-                    img_data = archivos.get(path)
-                    if img_data:
-                        break
-
-                if img_data:
-                    try:
-                        # Abrir y procesar la imagen
-                        img = Image.open(io.BytesIO(img_data))
-                        img = ImageOps.exif_transpose(img)
-                        
-                        # Asegurarse de que la imagen esté en el modo correcto
-                        if img.mode in ("RGBA", "LA", "P"):
-                            img = img.convert("RGB")
-                            
-                        # Redimensionar la imagen manteniendo la proporción
-                        img.thumbnail((max_px, max_px), Image.LANCZOS)
-                        
-                        # Guardar en buffer
-                        buffer = io.BytesIO()
-                        img.save(buffer, format="JPEG", quality=80, optimize=True)
-                        buffer.seek(0)
-                        
+                p_title = tf.paragraphs[0]
+                p_title.text = gplan.nombre
+                # 3. Establecer un tamaño de fuente INICIAL grande. Autoajuste lo reducirá si es necesario.
+                p_title.font.size = Pt(16)
+                # --- FIN DE LA CORRECCIÓN AVANZADA DE TÍTULO ---
+
+                label_y = margin_y_top - 0.3
+                label_box = slide.shapes.add_textbox(
+                    Inches(margin_x), Inches(label_y),
+                    Inches(3), Inches(0.4)
+                )
+                p_label = label_box.text_frame.paragraphs[0]
+                p_label.text = "FOTOGRAFÍAS:"
+                if p_label.runs:
+                    run_label = p_label.runs[0]
+                    run_label.font.bold = True
+                    run_label.font.size = Pt(12)
+
+                for idx, fp in enumerate(chunk):
+                    r = idx // cols
+                    c = idx % cols
+                    x = margin_x + c * (cell_w + spacing_x)
+                    y = margin_y_top + r * (cell_h + spacing_y)
+
+                    imagen, error = next(imagenes)
+                    if imagen:
                         # Agregar al slide
                         slide.shapes.add_picture(
-                            buffer, Inches(x), Inches(y),
+                            io.BytesIO(imagen.data), Inches(x), Inches(y),
                             width=Inches(cell_w), height=Inches(cell_h)
                         )
-                    except Exception as e:
-                        print(f"Error procesando imagen {foto.filename}: {str(e)}")
-
-            enum_y = slide_h_in - enumerated_h - margin_y_bottom
-            enum_x = margin_x
-            enum_w = slide_w_in - 2 * margin_x
-            header_h = 0.4
-            content_h = enumerated_h - header_h
-            details_w = enum_w * 0.7
-            recom_w = enum_w - details_w
-
-            header_det = slide.shapes.add_shape(
-                MSO_SHAPE.RECTANGLE,
-                Inches(enum_x), Inches(enum_y),
-                Inches(details_w), Inches(header_h)
-            )
-            header_det.fill.solid()
-            header_det.fill.fore_color.rgb = RGBColor(217, 217, 217)
-            header_det.line.color.rgb = header_det.fill.fore_color.rgb
-            txt_hd = header_det.text_frame
-            txt_hd.text = "UBICACIÓN Y DETALLE:"
-            if txt_hd.paragraphs[0].runs:
-                txt_hd.paragraphs[0].runs[0].font.bold = True
-
-            header_rec = slide.shapes.add_shape(
-                MSO_SHAPE.RECTANGLE,
-                Inches(enum_x + details_w), Inches(enum_y),
-                Inches(recom_w), Inches(header_h)
-            )
-            header_rec.fill.solid()
-            header_rec.fill.fore_color.rgb = RGBColor(217, 217, 217)
-            header_rec.line.color.rgb = header_rec.fill.fore_color.rgb
-            txt_hr = header_rec.text_frame
-            txt_hr.text = "RECOMENDACIONES:"
-            if txt_hr.paragraphs[0].runs:
-                txt_hr.paragraphs[0].runs[0].font.bold = True
-
-            body_det = slide.shapes.add_shape(
-                MSO_SHAPE.RECTANGLE,
-                Inches(enum_x), Inches(enum_y + header_h),
-                Inches(details_w), Inches(content_h)
-            )
-            body_det.fill.solid()
-            body_det.fill.fore_color.rgb = RGBColor(255, 255, 255)
-            body_det.line.color.rgb = body_det.fill.fore_color.rgb
-            tf_det = body_det.text_frame
-            tf_det.clear()
-
-            # 1) Construir entradas (descripcion, variable) desde tus dos textos
-            entradas = []
-            for foto in chunk:
-                full_detail = foto.specific_detail
-                detail_after_plus = full_detail.split('+', 1)[1].strip() if '+' in full_detail else full_detail
-                entradas.append((detail_after_plus, foto.carpeta))
-
-            # 2) Generar oraciones agrupadas con NLG (umbral ajustable)
-            oraciones = agrupa_y_redacta(entradas, umbral_similitud=0.8)
-
-            # 3) Pintar el resultado enumerado en la caja de “UBICACIÓN Y DETALLE”
-            for idx, sentencia in enumerate(oraciones, start=1):
-                p = tf_det.add_paragraph()
-                p.text = f"{idx}. {sentencia}"
+                    elif error:
+                        print(f"Error procesando imagen {fp.foto.filename}: {str(error)}")
+
+                enum_y = slide_h_in - enumerated_h - margin_y_bottom
+                enum_x = margin_x
+                enum_w = slide_w_in - 2 * margin_x
+                header_h = 0.4
+                content_h = enumerated_h - header_h
+                details_w = enum_w * 0.7
+                recom_w = enum_w - details_w
+
+                header_det = slide.shapes.add_shape(
+                    MSO_SHAPE.RECTANGLE,
+                    Inches(enum_x), Inches(enum_y),
+                    Inches(details_w), Inches(header_h)
+                )
+                header_det.fill.solid()
+                header_det.fill.fore_color.rgb = RGBColor(217, 217, 217)
+                header_det.line.color.rgb = header_det.fill.fore_color.rgb
+                txt_hd = header_det.text_frame
+                txt_hd.text = "UBICACIÓN Y DETALLE:"
+                if txt_hd.paragraphs[0].runs:
+                    txt_hd.paragraphs[0].runs[0].font.bold = True
+
+                header_rec = slide.shapes.add_shape(
+                    MSO_SHAPE.RECTANGLE,
+                    Inches(enum_x + details_w), Inches(enum_y),
+                    Inches(recom_w), Inches(header_h)
+                )
+                header_rec.fill.solid()
+                header_rec.fill.fore_color.rgb = RGBColor(217, 217, 217)
+                header_rec.line.color.rgb = header_rec.fill.fore_color.rgb
+                txt_hr = header_rec.text_frame
+                txt_hr.text = "RECOMENDACIONES:"
+                if txt_hr.paragraphs[0].runs:
+                    txt_hr.paragraphs[0].runs[0].font.bold = True
+
+                body_det = slide.shapes.add_shape(
+                    MSO_SHAPE.RECTANGLE,
+                    Inches(enum_x), Inches(enum_y + header_h),
+                    Inches(details_w), Inches(content_h)
+                )
+                body_det.fill.solid()
+                body_det.fill.fore_color.rgb = RGBColor(255, 255, 255)
+                body_det.line.color.rgb = body_det.fill.fore_color.rgb
+                tf_det = body_det.text_frame
+                tf_det.clear()
+
+                # Oraciones agrupadas de las fotos de esta diapositiva (ubicación = carpeta)
+                oraciones = plan.oraciones(chunk)
+
+                # Pintar el resultado enumerado en la caja de “UBICACIÓN Y DETALLE”
+                for idx, sentencia in enumerate(oraciones, start=1):
+                    p = tf_det.add_paragraph()
+                    p.text = f"{idx}. {sentencia}"
+                    if p.runs:
+                        run = p.runs[0]
+                        run.font.size = Pt(10)
+                        run.font.color.rgb = RGBColor(0, 0, 0)
+
+                body_rec = slide.shapes.add_shape(
+                    MSO_SHAPE.RECTANGLE,
+                    Inches(enum_x + details_w), Inches(enum_y + header_h),
+                    Inches(recom_w), Inches(content_h)
+                )
+                body_rec.fill.solid()
+                body_rec.fill.fore_color.rgb = RGBColor(226, 240, 217)
+                body_rec.line.color.rgb = body_rec.fill.fore_color.rgb
+                tf_rec = body_rec.text_frame
+                tf_rec.clear()
+
+                p = tf_rec.paragraphs[0]
+                p.text = gplan.texto_recomendaciones
                 if p.runs:
-                    run = p.runs[0]
-                    run.font.size = Pt(10)
-                    run.font.color.rgb = RGBColor(0, 0, 0)
-
-            body_rec = slide.shapes.add_shape(
-                MSO_SHAPE.RECTANGLE,
-                Inches(enum_x + details_w), Inches(enum_y + header_h),
-                Inches(recom_w), Inches(content_h)
-            )
-            body_rec.fill.solid()
-            body_rec.fill.fore_color.rgb = RGBColor(226, 240, 217)
-            body_rec.line.color.rgb = body_rec.fill.fore_color.rgb
-            tf_rec = body_rec.text_frame
-            tf_rec.clear()
-
-            recs = getattr(grupo, "recomendaciones", None) or []
-            rec_text = "\n".join(f"• {r}" for r in recs) if recs else "—"
-
-            p = tf_rec.paragraphs[0]
-            p.text = rec_text
-            if p.runs:
-                p.runs[0].font.size = Pt(10)
+                    p.runs[0].font.size = Pt(10)
             
-            slides_done += 1
-            if progress_callback:
-                progress_percentage = int((slides_done / total_slides) * 100) if total_slides > 0 else 0
-                progress_callback.emit(progress_percentage)
-
-    prs.save(output_pptx_path)
+                slides_done += 1
+                if progress_callback:
+                    progress_percentage = int((slides_done / total_slides) * 100) if total_slides > 0 else 0
+                    progress_callback.emit(progress_percentage)
+
+        prs.save(output_pptx_path)
+    finally:
+        # También si falla el guardado: borrar las imágenes temporales
+        if medios is not None:
+            medios.close()
 
@@ -0,0 +1,145 @@
+"""
+xlsx_stream.py
+=================
+
+Escritura del libro XLSX hoja por hoja, con memoria acotada.
+
+openpyxl mantiene en memoria todas las celdas, estilos e imágenes de un
+``Workbook`` normal hasta ``save``. ``LibroStreaming`` recibe las hojas ya
+terminadas de un libro de trabajo (``borrador``), las copia a un
+``Workbook(write_only=True)`` —que escribe las filas a un archivo
+temporal a medida que se agregan— y las elimina del borrador. Las fotos
+incrustadas se pasan a archivos temporales y sólo se vuelven a leer al
+guardar.
+
+Así el código que arma cada hoja no cambia: sigue usando celdas, rangos
+combinados y dimensiones como siempre, y sólo hay una hoja en memoria a la
+vez.
+
+La copia usa la API pública de openpyxl salvo en un punto: openpyxl no
+expone las imágenes de una hoja, así que se leen de ``ws._images``. Por eso
+``requirements.txt`` fija la versión de openpyxl con la que se probó.
+
+Uso ejemplo:
+
+.. code-block:: python
+
+    libro = LibroStreaming()
+    wb = Workbook()
+    ws = wb.create_sheet("Hoja")
+    ...  # armar la hoja
+    libro.volcar(wb)  # copia y descarta las hojas terminadas de ``wb``
+    libro.save("informe.xlsx")
+"""
+
+import copy
+import os
+import tempfile
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.image import Image as OpenpyxlImage
+
+# Atributos de columna/fila que se copian (el resto se deriva de ellos)
+_ATRIBUTOS_COLUMNA = ("width", "hidden", "outlineLevel", "collapsed")
+_ATRIBUTOS_FILA = ("height", "hidden", "outlineLevel", "collapsed")
+# Configuración de impresión (los argumentos de ``PrintPageSetup``)
+_ATRIBUTOS_PAGINA = ("orientation", "paperSize", "scale", "fitToHeight", "fitToWidth",
+                     "firstPageNumber", "useFirstPageNumber", "paperHeight", "paperWidth",
+                     "pageOrder", "usePrinterDefaults", "blackAndWhite", "draft", "cellComments",
+                     "errors", "horizontalDpi", "verticalDpi", "copies", "id")
+
+
+class LibroStreaming:
+    """Libro XLSX de sólo escritura que se llena con hojas ya terminadas."""
+
+    def __init__(self, directorio: str | None = None):
+        self.destino = Workbook(write_only=True)
+        self._tmp = tempfile.TemporaryDirectory(prefix="inspectw_xlsx_", dir=directorio)
+        self._imagenes = 0
+
+    def volcar(self, borrador: Workbook) -> None:
+        """Copia al destino, en orden, todas las hojas de ``borrador`` y las quita de él."""
+        for ws in list(borrador.worksheets):
+            self._copiar_hoja(ws)
+            borrador.remove(ws)
+
+    def save(self, path: str) -> None:
+        try:
+            self.destino.save(path)
+        finally:
+            self._tmp.cleanup()
+
+    def _copiar_hoja(self, ws) -> None:
+        wo = self.destino.create_sheet(title=ws.title)
+
+        # --- Propiedades y configuración de impresión ---
+        wo.sheet_properties = copy.deepcopy(ws.sheet_properties)
+        wo.sheet_format = copy.deepcopy(ws.sheet_format)
+        wo.views = copy.deepcopy(ws.views)
+        wo.page_margins = copy.deepcopy(ws.page_margins)
+        wo.print_options = copy.deepcopy(ws.print_options)
+        wo.HeaderFooter = copy.deepcopy(ws.HeaderFooter)
+        # page_setup guarda una referencia a su hoja: se copian sus atributos
+        for attr in _ATRIBUTOS_PAGINA:
+            setattr(wo.page_setup, attr, getattr(ws.page_setup, attr))
+        if ws.print_area:
+            wo.print_area = ws.print_area
+
+        # --- Dimensiones (deben estar antes de la primera fila) ---
+        for clave, dim in ws.column_dimensions.items():
+            nueva = wo.column_dimensions[clave]
+            for attr in _ATRIBUTOS_COLUMNA:
+                setattr(nueva, attr, getattr(dim, attr))
+            nueva.min, nueva.max = dim.min, dim.max
+        for clave, dim in ws.row_dimensions.items():
+            nueva = wo.row_dimensions[clave]
+            for attr in _ATRIBUTOS_FILA:
+                setattr(nueva, attr, getattr(dim, attr))
+
+        # --- Celdas, fila por fila ---
+        ultima_fila = max([ws.max_row] + list(ws.row_dimensions.keys()))
+        for fila in ws.iter_rows(min_row=1, max_row=ultima_fila, max_col=ws.max_column):
+            wo.append([self._copiar_celda(wo, celda) for celda in fila])
+
+        for rango in ws.merged_cells.ranges:
+            wo.merged_cells.add(str(rango))
+
+        # --- Imágenes ---
+        for img in ws._images:
+            wo.add_image(self._imagen_en_disco(img))
+
+    @staticmethod
+    def _copiar_celda(wo, celda):
+        if celda.value is None and not celda.has_style:
+            return None
+        # Las celdas combinadas (MergedCell) no llevan valor, sólo estilo
+        nueva = WriteOnlyCell(wo, value=getattr(celda, "value", None))
+        if celda.has_style:
+            # Los estilos se reasignan como objetos (los índices internos de
+            # un libro no valen en el otro); copy() desenvuelve el StyleProxy
+            nueva.font = copy.copy(celda.font)
+            nueva.border = copy.copy(celda.border)
+            nueva.fill = copy.copy(celda.fill)
+            nueva.alignment = copy.copy(celda.alignment)
+            nueva.number_format = celda.number_format
+            nueva.protection = copy.copy(celda.protection)
+        return nueva
+
+    def _imagen_en_disco(self, img: OpenpyxlImage) -> OpenpyxlImage:
+        """Reemplaza una imagen en memoria por una equivalente respaldada por un archivo.
+
+        Sólo las creadas desde un flujo de bytes (como las fotos del informe);
+        las que ya vienen de un archivo o de una imagen de PIL se dejan igual.
+        """
+        if not hasattr(img.ref, "read"):
+            return img
+        self._imagenes += 1
+        ruta = os.path.join(self._tmp.name, f"imagen{self._imagenes}.{img.format}")
+        img.ref.seek(0)
+        with open(ruta, "wb") as f:
+            f.write(img.ref.read())
+        nueva = OpenpyxlImage(ruta)
+        nueva.width, nueva.height = img.width, img.height
+        nueva.anchor = img.anchor
+        return nueva
@@ -2,16 +2,28 @@
 from openpyxl.drawing.image import Image as OpenpyxlImage
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 from openpyxl.utils import get_column_letter
-from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
+from openpyxl.utils.cell import range_boundaries
 import openpyxl.drawing.image
 from openpyxl.drawing.spreadsheet_drawing import AbsoluteAnchor
 from openpyxl.drawing.xdr import XDRPoint2D, XDRPositiveSize2D
 from openpyxl.utils.units import pixels_to_EMU
-from typing import Dict
+from typing import Dict, Mapping
 from app.core.processing import Grupo
-from app.utils.nlg_utils import agrupa_y_redacta
-from PIL import Image, ImageOps
+from app.utils.nlg_utils import CacheRedaccion
+from app.utils.image_cache import CacheImagenes
+from app.report.xlsx_stream import LibroStreaming
+from app.report.plan import ReportPlan
 import io, math, os, re
+from copy import copy
+from functools import lru_cache
+
+# Celda de cada foto en las hojas de grupo: columna de 32 unidades y fila de
+# 180 pt, en píxeles, y margen interior
+CELDA_FOTO_PX = (229, 240)
+MARGEN_FOTO_PX = 4
+# Las fotos se reducen al tamaño de la celda con el doble de resolución para
+# que se vean nítidas al imprimir
+FORMATO_XLSX = ((CELDA_FOTO_PX[0] - MARGEN_FOTO_PX) * 2, (CELDA_FOTO_PX[1] - MARGEN_FOTO_PX) * 2, 85)
 import unicodedata
 
 def read_project_info(path: str) -> Dict[str, str]:
@@ -65,12 +77,10 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
             if val:
                 return val
         return ""
-    # Preparar estilos locales (bordes y rellenos) para evitar referencias a
-    # variables externas como `gray_fill` o `thin_border` que sólo existen en
-    # otros contextos. Estos se usan para tablas en la hoja de desarrollo.
-    gray_fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
-    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    thick_top_border = Border(top=Side(style='medium'))
+    # Estilos compartidos (ver ``fuente``/``relleno``/``borde``/``alineacion``)
+    gray_fill = relleno("D9D9D9")
+    thin_border = borde(estilo='thin')
+    thick_top_border = borde(estilo='medium', lados=('top',))
 
     # --------------------------------------------------------------------------
     # Hoja de portada
@@ -92,11 +102,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
     for col in ["A", "B", "C", "D", "E", "F", "G", "H"]:
         portada.column_dimensions[col].width = 12
 
-    light_fill = PatternFill(start_color="F5F5F5", end_color="F5F5F5", fill_type="solid")
-    for row in range(1, 51): # Increased row range for A4 feel
-        for col_idx in range(1, 9):
-            cell = portada.cell(row=row, column=col_idx)
-            cell.fill = light_fill
+    aplicar_estilo_rango(portada, "A1:H50", fill=relleno("F5F5F5")) # Increased row range for A4 feel
 
     # --- 1. Logo ---
     portada.row_dimensions[1].height = 25
@@ -136,7 +142,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         main_title,
         bold=True,
         size=16,
-        alignment=Alignment(horizontal="center", vertical="center", wrap_text=True)
+        alignment=alineacion(horizontal="center", vertical="center", wrap_text=True)
     )
 
     # --- 4. Separator line after title ---
@@ -152,9 +158,9 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         image_placeholder_cell,
         "Espacio para imagen",
         size=12,
-        alignment=Alignment(horizontal="center", vertical="center")
+        alignment=alineacion(horizontal="center", vertical="center")
     )
-    image_placeholder_cell.fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
+    image_placeholder_cell.fill = relleno("E0E0E0")
     for row in range(9, 19):
         portada.row_dimensions[row].height = 20
 
@@ -187,7 +193,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
             label,
             bold=True,
             size=12,
-            alignment=Alignment(horizontal="right", vertical="center")
+            alignment=alineacion(horizontal="right", vertical="center")
         )
         # Value
         portada.merge_cells(start_row=current_row, start_column=5, end_row=current_row, end_column=8)
@@ -196,7 +202,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
             cell_val,
             value,
             size=12,
-            alignment=Alignment(horizontal="left", vertical="center", wrap_text=True)
+            alignment=alineacion(horizontal="left", vertical="center", wrap_text=True)
         )
 
     # --- Footer ---
@@ -209,7 +215,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         "LIMA-2025", # This could also be dynamic from info
         bold=False,
         size=12,
-        alignment=Alignment(horizontal="center", vertical="center")
+        alignment=alineacion(horizontal="center", vertical="center")
     )
 
     # --------------------------------------------------------------------------
@@ -245,7 +251,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         "INFORME DE INSPECCIÓN SIMULACRO",
         bold=True,
         size=14,
-        alignment=Alignment(horizontal="center", vertical="center")
+        alignment=alineacion(horizontal="center", vertical="center")
     )
     datos.row_dimensions[1].height = 35
     # Reemplazar encabezado con el Título del infoproyecto si está disponible
@@ -260,7 +266,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         "1. DATOS GENERALES",
         bold=True,
         size=12,
-        alignment=Alignment(horizontal="left", vertical="center")
+        alignment=alineacion(horizontal="left", vertical="center")
     )
     datos.row_dimensions[3].height = 25
     # Fila por cada subapartado
@@ -278,8 +284,8 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
     for label, value in sec1:
         # Etiqueta
         datos[f"A{row_ptr}"].value = label
-        datos[f"A{row_ptr}"].font = Font(bold=True, size=10)
-        datos[f"A{row_ptr}"].alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
+        datos[f"A{row_ptr}"].font = fuente(bold=True, size=10)
+        datos[f"A{row_ptr}"].alignment = alineacion(horizontal="left", vertical="top", wrap_text=True)
         # Para campos que pueden ocupar varias líneas, se fusionan varias filas
         if label.startswith("1.6") or label.startswith("1.7") or label.startswith("1.8"):
             # Reservar dos filas para estos campos
@@ -288,7 +294,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
             set_cell_style(
                 cell_val,
                 value,
-                alignment=Alignment(horizontal="left", vertical="top", wrap_text=True)
+                alignment=alineacion(horizontal="left", vertical="top", wrap_text=True)
             )
             datos.row_dimensions[row_ptr].height = 30
             datos.row_dimensions[row_ptr + 1].height = 30
@@ -299,7 +305,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
             set_cell_style(
                 cell_val,
                 value,
-                alignment=Alignment(horizontal="left", vertical="top", wrap_text=True)
+                alignment=alineacion(horizontal="left", vertical="top", wrap_text=True)
             )
             datos.row_dimensions[row_ptr].height = 20
             row_ptr += 1
@@ -310,7 +316,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         "2. ANTECEDENTES",
         bold=True,
         size=12,
-        alignment=Alignment(horizontal="left", vertical="center")
+        alignment=alineacion(horizontal="left", vertical="center")
     )
     datos.row_dimensions[row_ptr].height = 25
     row_ptr += 1
@@ -324,14 +330,14 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
     ]
     for label, value in antecedentes:
         datos[f"A{row_ptr}"].value = label
-        datos[f"A{row_ptr}"].font = Font(bold=True, size=10)
-        datos[f"A{row_ptr}"].alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
+        datos[f"A{row_ptr}"].font = fuente(bold=True, size=10)
+        datos[f"A{row_ptr}"].alignment = alineacion(horizontal="left", vertical="top", wrap_text=True)
         # Fusionar celdas para el valor
         datos.merge_cells(start_row=row_ptr, start_column=2, end_row=row_ptr, end_column=4)
         set_cell_style(
             datos.cell(row=row_ptr, column=2),
             value,
-            alignment=Alignment(horizontal="left", vertical="top", wrap_text=True)
+            alignment=alineacion(horizontal="left", vertical="top", wrap_text=True)
         )
         datos.row_dimensions[row_ptr].height = 20
         row_ptr += 1
@@ -365,7 +371,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         "3. DESARROLLO DEL SIMULACRO:",
         bold=True,
         size=12,
-        alignment=Alignment(horizontal="left", vertical="center")
+        alignment=alineacion(horizontal="left", vertical="center")
     )
     desarrollo.row_dimensions[1].height = 25
     # Párrafo descriptivo
@@ -379,19 +385,19 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         desarrollo["A2"],
         descriptive_text,
         size=10,
-        alignment=Alignment(horizontal="justify", vertical="top", wrap_text=True)
+        alignment=alineacion(horizontal="justify", vertical="top", wrap_text=True)
     )
     desarrollo.row_dimensions[2].height = 40
     desarrollo.row_dimensions[3].height = 40
     # Observaciones especiales
     desarrollo["A5"].value = "Observaciones especiales:"
-    desarrollo["A5"].font = Font(bold=True, size=10)
-    desarrollo["A5"].alignment = Alignment(horizontal="left", vertical="center")
+    desarrollo["A5"].font = fuente(bold=True, size=10)
+    desarrollo["A5"].alignment = alineacion(horizontal="left", vertical="center")
     # Área para observaciones (filas 5‑7, columnas B‑D)
     desarrollo.merge_cells(start_row=5, start_column=2, end_row=7, end_column=4)
     obs_cell = desarrollo.cell(row=5, column=2)
     obs_cell.border = thin_border
-    obs_cell.alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
+    obs_cell.alignment = alineacion(horizontal="left", vertical="top", wrap_text=True)
     obs_cell.value = ""  # área en blanco para completar
     desarrollo.row_dimensions[5].height = 25
     desarrollo.row_dimensions[6].height = 25
@@ -407,7 +413,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         size=10,
         fill=gray_fill,
         border=thin_border,
-        alignment=Alignment(horizontal="left", vertical="center")
+        alignment=alineacion(horizontal="left", vertical="center")
     )
     desarrollo.row_dimensions[start_table_row].height = 20
     # Fila de encabezados de la tabla (después del título)
@@ -421,7 +427,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         size=9,
         fill=gray_fill,
         border=thin_border,
-        alignment=Alignment(horizontal="center", vertical="center", wrap_text=True)
+        alignment=alineacion(horizontal="center", vertical="center", wrap_text=True)
     )
     # Segunda columna: Sí / No
     set_cell_style(
@@ -431,7 +437,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         size=9,
         fill=gray_fill,
         border=thin_border,
-        alignment=Alignment(horizontal="center", vertical="center", wrap_text=True)
+        alignment=alineacion(horizontal="center", vertical="center", wrap_text=True)
     )
     # Tercera columna: No corresponde
     set_cell_style(
@@ -441,7 +447,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         size=9,
         fill=gray_fill,
         border=thin_border,
-        alignment=Alignment(horizontal="center", vertical="center", wrap_text=True)
+        alignment=alineacion(horizontal="center", vertical="center", wrap_text=True)
     )
     desarrollo.row_dimensions[header_row].height = 25
     # Detalle de cada condición (filas 11‑14)
@@ -479,7 +485,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
             descripcion,
             size=9,
             border=thin_border,
-            alignment=Alignment(horizontal="left", vertical="top", wrap_text=True)
+            alignment=alineacion(horizontal="left", vertical="top", wrap_text=True)
         )
         # Columna Sí/No
         set_cell_style(
@@ -487,7 +493,7 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
             si_no,
             size=9,
             border=thin_border,
-            alignment=Alignment(horizontal="center", vertical="center")
+            alignment=alineacion(horizontal="center", vertical="center")
         )
         # Columna No corresponde
         set_cell_style(
@@ -495,20 +501,20 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
             no_corresponde,
             size=9,
             border=thin_border,
-            alignment=Alignment(horizontal="center", vertical="center")
+            alignment=alineacion(horizontal="center", vertical="center")
         )
         desarrollo.row_dimensions[current].height = 35
         current += 1
     # Comentarios adicionales
     comentarios_row = current + 1
     desarrollo[f"A{comentarios_row}"] = "Comentarios adicionales al respecto:"
-    desarrollo[f"A{comentarios_row}"].font = Font(bold=True, size=10)
-    desarrollo[f"A{comentarios_row}"].alignment = Alignment(horizontal="left", vertical="center")
+    desarrollo[f"A{comentarios_row}"].font = fuente(bold=True, size=10)
+    desarrollo[f"A{comentarios_row}"].alignment = alineacion(horizontal="left", vertical="center")
     # Área para comentarios (celdas B–D varias filas)
     desarrollo.merge_cells(start_row=comentarios_row, start_column=2, end_row=comentarios_row + 2, end_column=4)
     comentarios_cell = desarrollo.cell(row=comentarios_row, column=2)
     comentarios_cell.border = thin_border
-    comentarios_cell.alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
+    comentarios_cell.alignment = alineacion(horizontal="left", vertical="top", wrap_text=True)
     comentarios_cell.value = ""
     desarrollo.row_dimensions[comentarios_row].height = 25
     desarrollo.row_dimensions[comentarios_row + 1].height = 25
@@ -530,31 +536,72 @@ def add_intro_sheets(wb: Workbook, info_path: str | Dict[str, str], logo_path: s
         pass
 
 
-def natural_sort_key(s):
-    return [int(text) if text.isdigit() else text.lower() for text in re.split('([0-9]+)', s[0])]
+# ----------------------------------------------------------------------
+# Registro de estilos
+# ----------------------------------------------------------------------
+# Cada combinación de parámetros crea su objeto de estilo una sola vez y se
+# reutiliza en todas las celdas y hojas. openpyxl deduplica los estilos al
+# asignarlos, pero construir y comparar un Font/Border nuevo por celda es
+# caro en informes con cientos de hojas. Los objetos devueltos son
+# compartidos: no se deben modificar.
+# Se llaman siempre con argumentos por nombre, en el orden de la firma:
+# lru_cache guarda por separado fuente(True, 12) y fuente(bold=True, size=12).
+
+@lru_cache(maxsize=None)
+def fuente(bold=False, size=11) -> Font:
+    return Font(bold=bold, size=size)
+
+@lru_cache(maxsize=None)
+def relleno(color: str) -> PatternFill:
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+@lru_cache(maxsize=None)
+def borde(estilo='thin', lados=('left', 'right', 'top', 'bottom')) -> Border:
+    return Border(**{lado: Side(style=estilo) for lado in lados})
+
+@lru_cache(maxsize=None)
+def alineacion(horizontal=None, vertical=None, wrap_text=None) -> Alignment:
+    return Alignment(horizontal=horizontal, vertical=vertical, wrap_text=wrap_text)
+
+def aplicar_estilo_rango(ws, rango, font=None, fill=None, border=None, alignment=None):
+    """Aplica los estilos dados a todas las celdas de ``rango`` (p. ej. ``"A1:C3"``).
+
+    Los estilos se asignan una vez por cada estilo previo distinto del rango;
+    el resto de las celdas copian el resultado ya calculado.
+
+    La copia usa ``cell._style`` (el ``StyleArray`` de índices de la
+    celda), que no es API pública: con los setters cada celda vuelve a
+    buscar sus estilos en el libro y el rango tarda varias veces más.
+    ``requirements.txt`` fija openpyxl a 3.1.x por esto; la prueba
+    ``test_aplicar_estilo_rango_igual_que_los_setters`` compara el
+    resultado con el de los setters públicos antes de subir de versión.
+    """
+    min_col, min_row, max_col, max_row = range_boundaries(rango)
+    resultados = {}
+    for fila in ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+        for cell in fila:
+            previo = tuple(cell._style or ())
+            nuevo = resultados.get(previo)
+            if nuevo is not None:
+                cell._style = copy(nuevo)
+                continue
+            if font:
+                cell.font = font
+            if fill:
+                cell.fill = fill
+            if border:
+                cell.border = border
+            if alignment:
+                cell.alignment = alignment
+            resultados[previo] = copy(cell._style)
 
 def apply_border_to_range(ws, start_cell, end_cell, border_style='thin'):
     """Aplica bordes a un rango de celdas."""
-    border = Border(
-        left=Side(style=border_style),
-        right=Side(style=border_style),
-        top=Side(style=border_style),
-        bottom=Side(style=border_style)
-    )
-    
-    # Convertir referencias de celda a coordenadas
-    start_coord = coordinate_from_string(start_cell)
-    end_coord = coordinate_from_string(end_cell)
-    start_col = column_index_from_string(start_coord[0])
-    end_col = column_index_from_string(end_coord[0])
-    
-    for row in range(start_coord[1], end_coord[1] + 1):
-        for col in range(start_col, end_col + 1):
-            ws.cell(row=row, column=col).border = border
+    aplicar_estilo_rango(ws, f"{start_cell}:{end_cell}", border=borde(estilo=border_style))
 
 def set_cell_style(cell, text, bold=False, size=11, alignment=None, fill=None, border=None):
     cell.value = text
-    cell.font = Font(bold=bold, size=size)
+    cell.font = fuente(bold=bold, size=size)
     if alignment:
         cell.alignment = alignment
     if fill:
@@ -574,44 +621,86 @@ def estimate_visual_lines(text: str, chars_per_line: int) -> int:
 
 def export_groups_to_xlsx_report(
     grupos: Dict[str, Grupo],
-    archivos: Dict[str, bytes],
+    archivos: Mapping[str, bytes],
+    output_xlsx_path: str,
+    progress_callback=None,
+    info_path: str = os.path.join("datos", "infoproyect.txt"),
+    control_documents=None,
+    conclusiones: list[str] | None = None,
+    max_workers: int | None = None,
+    cache: CacheImagenes | None = None,
+    low_memory: bool = False,
+    nlg: CacheRedaccion | None = None,
+    ) -> None:
+    """Genera el informe XLSX: hojas iniciales, una hoja por grupo y control de documentos.
+
+    Arma un ``ReportPlan`` y lo dibuja con ``export_plan_to_xlsx_report``.
+    ``nlg`` es la caché de agrupamientos de descripciones del proyecto
+    (ver ``CacheRedaccion``).
+    """
+    plan = ReportPlan(grupos, archivos, cache=cache, nlg=nlg)
+    export_plan_to_xlsx_report(plan, output_xlsx_path, progress_callback=progress_callback, info_path=info_path,
+                               control_documents=control_documents, conclusiones=conclusiones,
+                               max_workers=max_workers, low_memory=low_memory)
+
+def export_plan_to_xlsx_report(
+    plan: ReportPlan,
     output_xlsx_path: str,
     progress_callback=None,
     info_path: str = os.path.join("datos", "infoproyect.txt"),
     control_documents=None,
     conclusiones: list[str] | None = None,
+    max_workers: int | None = None,
+    low_memory: bool = False,
     ) -> None:
+    """Dibuja el informe XLSX de ``plan``, con los grupos en orden natural.
+
+    Con ``low_memory`` cada hoja se pasa a un libro de sólo escritura
+    (``LibroStreaming``) apenas se termina, así que la memoria no crece con
+    la cantidad de grupos. El resultado tiene el mismo diseño.
+    """
+    archivos = plan.archivos
     wb = Workbook()
     wb.remove(wb.active)  # Remove default sheet
+    libro = LibroStreaming() if low_memory else None
 
     # Agregar hojas independientes iniciales
     # Intentar leer 'infoproyect.txt' desde los archivos cargados (ZIP/carpeta)
     info_from_archivos = None
     try:
-        for k, v in archivos.items():
+        # Recorrer sólo las claves: con fuentes perezosas ``items()`` leería todas las fotos
+        for k in archivos.keys():
             base = os.path.basename(k).lower()
             if base.startswith('infoproyect') and base.endswith('.txt'):
                 try:
-                    info_from_archivos = parse_project_info_text(v.decode('utf-8', errors='ignore'))
+                    info_from_archivos = parse_project_info_text(archivos[k].decode('utf-8', errors='ignore'))
                     break
                 except Exception:
                     pass
     except Exception:
         pass
     add_intro_sheets(wb, info_from_archivos if info_from_archivos else info_path, logo_path="datos/portadat.png")
+    if libro:
+        libro.volcar(wb)
 
     # Define styles
-    header_font = Font(bold=True, size=12)
-    gray_fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
-    green_fill = PatternFill(start_color="E2F0D9", end_color="E2F0D9", fill_type="solid")
-    red_fill = PatternFill(start_color="F8CBAD", end_color="F8CBAD", fill_type="solid")
-    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+    header_font = fuente(bold=True, size=12)
+    gray_fill = relleno("D9D9D9")
+    green_fill = relleno("E2F0D9")
+    red_fill = relleno("F8CBAD")
+    thin_border = borde(estilo='thin')
 
     # Natural sort for group names
-    sorted_grupos = sorted(grupos.items(), key=natural_sort_key)
+    sorted_grupos = plan.en_orden_natural()
     total_grupos = len(sorted_grupos)
 
-    for idx, (gname, grupo) in enumerate(sorted_grupos):
+    # Las fotos se preparan en paralelo, en el mismo orden en que se insertan.
+    cell_w_px, cell_h_px = CELDA_FOTO_PX
+    margin = MARGEN_FOTO_PX
+    imagenes = plan.imagenes(sorted_grupos, FORMATO_XLSX, max_workers=max_workers)
+
+    for idx, gplan in enumerate(sorted_grupos):
+        gname = gplan.nombre
         # Replace invalid characters for sheet titles
         invalid_chars = ['/', '\\', '?', '*', '[', ']']
         sanitized_gname = gname
@@ -645,7 +734,7 @@ def export_groups_to_xlsx_report(
             banner_text,
             bold=True,
             size=11,
-            alignment=Alignment(horizontal='left', vertical='center', wrap_text=True),
+            alignment=alineacion(horizontal='left', vertical='center', wrap_text=True),
             fill=gray_fill,
             border=thin_border,
         )
@@ -658,7 +747,7 @@ def export_groups_to_xlsx_report(
         title_cell = ws['A2']
         set_cell_style(title_cell, gname, bold=True, size=12)
         
-        title_cell.alignment = Alignment(wrap_text=True, vertical='center', horizontal='left')
+        title_cell.alignment = alineacion(horizontal='left', vertical='center', wrap_text=True)
         
         # Ajustar cálculo de líneas al nuevo ancho total (aprox 90 chars)
         text_lines = len(gname) // 90 + 1
@@ -668,22 +757,21 @@ def export_groups_to_xlsx_report(
 
         # --- Photo section header ---
         ws.merge_cells('A3:C3')
-        set_cell_style(ws['A3'], "FOTOGRAFÍAS:", bold=True, size=12, alignment=Alignment(horizontal='left', vertical='center'))
+        set_cell_style(ws['A3'], "FOTOGRAFÍAS:", bold=True, size=12, alignment=alineacion(horizontal='left', vertical='center'))
         ws['A3'].font = header_font
         apply_border_to_range(ws, 'A3', 'C3')
         
         # --- Photo file names ---
         cols, rows = 3, 2
         per_page = cols * rows
-        num_fotos = len(grupo.fotos)
-        pages = math.ceil(num_fotos / per_page) if per_page else 0
+        paginas = gplan.paginas(per_page)
+        pages = len(paginas)
 
         # Ancho de celda aprox 230px con el nuevo ancho de columna
-        image_cell_height_px = 240
+        image_cell_height_px = cell_h_px
         
         current_row = 4
-        for page in range(pages):
-            chunk = grupo.fotos[page * per_page:(page + 1) * per_page]
+        for page, chunk in enumerate(paginas):
             
             # Procesar cada fila de fotos y añadir una fila de etiquetas debajo
             for r in range(rows):
@@ -698,60 +786,31 @@ def export_groups_to_xlsx_report(
                     if chunk_idx >= len(chunk):
                         break # No hay más fotos en esta página
 
-                    idx_global = page * per_page + chunk_idx + 1
-                    foto = chunk[chunk_idx]
+                    idx_global = chunk[chunk_idx].numero
+                    foto = chunk[chunk_idx].foto
                     cell_pos = f"{get_column_letter(c + 1)}{photo_row_idx}"
                     
-                    possible_paths = [
-                        f"{foto.carpeta}/{foto.filename}",
-                        f"{foto.carpeta}\\{foto.filename}",
-                        foto.filename,
-                        f"{foto.carpeta.replace('/', '')}\\{foto.filename}"
-                    ]
-                    
-                    img_data = None
-                    for path in possible_paths:
-                        img_data = archivos.get(path)
-                        if img_data:
-                            break
-                    
-                    if img_data:
-                        try:
-                            img = Image.open(io.BytesIO(img_data))
-                            img = ImageOps.exif_transpose(img)
-                            if img.mode in ("RGBA", "LA", "P"): img = img.convert("RGB")
-
-                            # Optimización: Redimensionar y guardar como JPEG para reducir tamaño.
-                            max_px = 1200 # Tamaño máximo para el lado más largo de la imagen.
-                            img.thumbnail((max_px, max_px), Image.Resampling.LANCZOS)
-
-                            cell_w_px = 229 # Ancho de celda (32 unidades) en píxeles
-                            cell_h_px = 240 # Alto de celda (180 pt) en píxeles
-
-                            # Calcular dimensiones de visualización manteniendo el aspect ratio
-                            margin = 4
-                            ratio = min((cell_w_px - margin) / img.width, (cell_h_px - margin) / img.height)
-                            display_width, display_height = int(img.width * ratio), int(img.height * ratio)
-
-                            img_bytes = io.BytesIO()
-                            # Guardar como JPEG con calidad optimizada en lugar de PNG
-                            img.save(img_bytes, format='JPEG', quality=85, optimize=True)
-                            img_bytes.seek(0)
-                            img_excel = openpyxl.drawing.image.Image(img_bytes)
-
-                            # Asignar tamaño de visualización y anclar a la celda
-                            img_excel.width = display_width
-                            img_excel.height = display_height
-                            img_excel.anchor = cell_pos
-                            ws.add_image(img_excel)
-
-                            # Añadir etiqueta [Foto x] en la celda de abajo
-                            label_cell_coord = f"{get_column_letter(c + 1)}{label_row_idx}"
-                            set_cell_style(ws[label_cell_coord], f"[Foto {idx_global}]", size=9, alignment=Alignment(horizontal='center', vertical='center'), border=thin_border)
-
-                        except Exception as e:
-                            print(f"Error procesando imagen {foto.filename}: {str(e)}")
-                            ws[cell_pos] = f"{foto.carpeta}/{foto.filename}"
+                    imagen, error = next(imagenes)
+
+                    if imagen:
+                        # Calcular dimensiones de visualización manteniendo el aspect ratio
+                        ratio = min((cell_w_px - margin) / imagen.width, (cell_h_px - margin) / imagen.height)
+                        display_width, display_height = int(imagen.width * ratio), int(imagen.height * ratio)
+
+                        img_excel = openpyxl.drawing.image.Image(io.BytesIO(imagen.data))
+
+                        # Asignar tamaño de visualización y anclar a la celda
+                        img_excel.width = display_width
+                        img_excel.height = display_height
+                        img_excel.anchor = cell_pos
+                        ws.add_image(img_excel)
+
+                        # Añadir etiqueta [Foto x] en la celda de abajo
+                        label_cell_coord = f"{get_column_letter(c + 1)}{label_row_idx}"
+                        set_cell_style(ws[label_cell_coord], f"[Foto {idx_global}]", size=9, alignment=alineacion(horizontal='center', vertical='center'), border=thin_border)
+                    elif error:
+                        print(f"Error procesando imagen {foto.filename}: {str(error)}")
+                        ws[cell_pos] = f"{foto.carpeta}/{foto.filename}"
                     else:
                         ws[cell_pos] = f"{foto.carpeta}/{foto.filename}"
             
@@ -769,13 +828,8 @@ def export_groups_to_xlsx_report(
         current_row += 1
 
         # --- Details Content ---
-        entradas = []
-        for i, foto in enumerate(grupo.fotos, start=1):
-            full_detail = foto.specific_detail
-            detail_after_plus = full_detail.split('+', 1)[1].strip() if '+' in full_detail else full_detail
-            entradas.append((detail_after_plus, f"{foto.carpeta} [Foto {i}]")) # Usar el índice global
-            
-        oraciones = agrupa_y_redacta(entradas, umbral_similitud=0.8)
+        # Ubicación con el número de la foto en el grupo: "carpeta [Foto n]"
+        oraciones = plan.oraciones(gplan.fotos, numerar=True)
         details_text = "\n".join(f"{i}. {sentencia}" for i, sentencia in enumerate(oraciones, start=1))
 
         chars_per_line_details = 90 # Ancho de 3 columnas
@@ -786,7 +840,7 @@ def export_groups_to_xlsx_report(
         ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row + needed_rows_details - 1, end_column=3)
         for i in range(needed_rows_details):
             ws.row_dimensions[current_row + i].height = 16
-        set_cell_style(details_content_cell, details_text, size=10, alignment=Alignment(wrap_text=True, vertical='top'))
+        set_cell_style(details_content_cell, details_text, size=10, alignment=alineacion(vertical='top', wrap_text=True))
         apply_border_to_range(
             ws,
             f'A{current_row}',
@@ -801,8 +855,7 @@ def export_groups_to_xlsx_report(
         current_row += 1
 
         # --- Recommendations Content ---
-        recs = getattr(grupo, "recomendaciones", None) or []
-        rec_text = "\n".join(f"• {r}" for r in recs) if recs else "—"
+        rec_text = gplan.texto_recomendaciones
         chars_per_line_recs = 90
         rec_lines_visual = estimate_visual_lines(rec_text, chars_per_line_recs)
         needed_rows_recs = max(4, rec_lines_visual)
@@ -811,7 +864,7 @@ def export_groups_to_xlsx_report(
         ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row + needed_rows_recs - 1, end_column=3)
         for i in range(needed_rows_recs):
             ws.row_dimensions[current_row + i].height = 16
-        set_cell_style(rec_content_cell, rec_text, size=10, alignment=Alignment(wrap_text=True, vertical='top'), fill=green_fill)
+        set_cell_style(rec_content_cell, rec_text, size=10, alignment=alineacion(vertical='top', wrap_text=True), fill=green_fill)
         apply_border_to_range(
             ws,
             f'A{current_row}',
@@ -823,6 +876,9 @@ def export_groups_to_xlsx_report(
         ws.column_dimensions['B'].width = 32
         ws.column_dimensions['C'].width = 32
 
+        if libro:
+            libro.volcar(wb)
+
         if progress_callback:
             progress_percentage = int(((idx + 1) / total_grupos) * 100)
             progress_callback.emit(progress_percentage)
@@ -861,7 +917,7 @@ def export_groups_to_xlsx_report(
             '5. CONTROL DE DOCUMENTACIÓN DE SEGURIDAD',
             bold=True,
             size=12,
-            alignment=Alignment(horizontal='left', vertical='center')
+            alignment=alineacion(horizontal='left', vertical='center')
         )
         ws.row_dimensions[1].height = 25
 
@@ -869,21 +925,18 @@ def export_groups_to_xlsx_report(
         ws['A3'].value = 'N°'
         ws['B3'].value = 'CERTIFICADOS, CONSTANCIAS Y/O PROTOCOLO'
         ws['C3'].value = 'SITUACION'
-        for col in ['A', 'B', 'C']:
-            cell = ws[f'{col}3']
-            cell.font = Font(bold=True, size=10)
-            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-            cell.fill = gray_fill
-            cell.border = thin_border
+        aplicar_estilo_rango(ws, 'A3:C3', font=fuente(bold=True, size=10),
+                             alignment=alineacion(horizontal='center', vertical='center', wrap_text=True),
+                             fill=gray_fill, border=thin_border)
         ws.row_dimensions[3].height = 22
 
         # Filas
         row = 4
         for num, descripcion, situacion in items_slice:
-            set_cell_style(ws[f'A{row}'], str(num), size=10, alignment=Alignment(horizontal='center', vertical='top'), border=thin_border)
+            set_cell_style(ws[f'A{row}'], str(num), size=10, alignment=alineacion(horizontal='center', vertical='top'), border=thin_border)
 
             desc_cell = ws[f'B{row}']
-            set_cell_style(desc_cell, descripcion, size=10, alignment=Alignment(wrap_text=True, vertical='top'), border=thin_border)
+            set_cell_style(desc_cell, descripcion, size=10, alignment=alineacion(vertical='top', wrap_text=True), border=thin_border)
 
             sit_cell = ws[f'C{row}']
             # Determinar color según el contenido de situacion
@@ -899,7 +952,7 @@ def export_groups_to_xlsx_report(
                 fill = red_fill
             elif 'correcto' in low or 'cumple' in low:
                 fill = green_fill
-            set_cell_style(sit_cell, sit_text, size=10, alignment=Alignment(wrap_text=True, vertical='top'), fill=fill, border=thin_border)
+            set_cell_style(sit_cell, sit_text, size=10, alignment=alineacion(vertical='top', wrap_text=True), fill=fill, border=thin_border)
 
             # Altura de fila estimada
             # Estimar con chars_per_line acordes a los nuevos anchos
@@ -990,13 +1043,17 @@ def export_groups_to_xlsx_report(
             # Buscar primera fila libre
             last_row = ws.max_row + 2
             ws.merge_cells(start_row=last_row, start_column=1, end_row=last_row, end_column=3)
-            set_cell_style(ws.cell(row=last_row, column=1), '6. CONCLUSIONES:', bold=True, size=12, alignment=Alignment(horizontal='left', vertical='center'))
+            set_cell_style(ws.cell(row=last_row, column=1), '6. CONCLUSIONES:', bold=True, size=12, alignment=alineacion(horizontal='left', vertical='center'))
             ws.row_dimensions[last_row].height = 24
             row = last_row + 1
             for i, txt in enumerate(conclusiones, start=1):
                 ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=3)
-                set_cell_style(ws.cell(row=row, column=1), f"{i}. {txt}", size=10, alignment=Alignment(wrap_text=True, vertical='top'))
+                set_cell_style(ws.cell(row=row, column=1), f"{i}. {txt}", size=10, alignment=alineacion(vertical='top', wrap_text=True))
                 ws.row_dimensions[row].height = 18 * max(2, estimate_visual_lines(txt, 90))
                 row += 1
 
-    wb.save(output_xlsx_path)
+    if libro:
+        libro.volcar(wb)
+        libro.save(output_xlsx_path)
+    else:
+        wb.save(output_xlsx_path)
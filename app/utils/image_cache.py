@@ -0,0 +1,148 @@
+"""
+image_cache.py
+=================
+
+Caché en disco de las fotos ya preparadas (ver ``image_utils``).
+
+La clave es un hash del contenido original de la foto más los parámetros
+de preparación (tamaño máximo, calidad y versión del procesamiento: EXIF,
+decodificación reducida...), así que una misma foto sirve tanto para el
+informe PPTX como para el XLSX y las miniaturas de la ventana sin volver a
+decodificarse, aunque cambie el ZIP o la carpeta que la contiene.
+
+El tamaño total se mantiene bajo ``limite_bytes`` eliminando primero las
+entradas usadas hace más tiempo (la fecha de modificación de cada archivo
+se actualiza en cada acierto). Las escrituras son atómicas, de modo que
+varios procesos pueden compartir el mismo directorio.
+
+Uso ejemplo:
+
+.. code-block:: python
+
+    cache = CacheImagenes()
+    imagen = cache.preparar(img_data, 1600, 1600, quality=80)
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+from PIL import Image
+
+from app.utils.image_utils import ImagenPreparada, preparar_imagen
+
+# Cambiar si cambia la forma de preparar las fotos, para no reutilizar
+# resultados viejos (orientación EXIF aplicada + draft de JPEG).
+_VERSION_PROCESO = b"exif-transpose/draft-2x/lanczos"
+
+LIMITE_POR_DEFECTO = 512 * 1024 * 1024
+
+
+def directorio_por_defecto() -> str:
+    """Carpeta de caché del usuario (``%LOCALAPPDATA%`` en Windows, ``~/.cache`` en el resto)."""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "inspectw", "imagenes")
+
+
+class CacheImagenes:
+    """Caché LRU en disco de ``ImagenPreparada`` indexada por contenido."""
+
+    def __init__(self, directorio: str | None = None, limite_bytes: int = LIMITE_POR_DEFECTO):
+        self.directorio = directorio or directorio_por_defecto()
+        self.limite_bytes = limite_bytes
+        self._lock = threading.Lock()
+        self._total: int | None = None  # se calcula al primer guardado
+
+    def clave(self, img_data: bytes, max_w: int, max_h: int, quality: int) -> str:
+        h = hashlib.blake2b(img_data, digest_size=20)
+        h.update(b"|%dx%d|q%d|" % (max_w, max_h, quality))
+        h.update(_VERSION_PROCESO)
+        return h.hexdigest()
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave[:2], clave + ".jpg")
+
+    def obtener(self, clave: str) -> ImagenPreparada | None:
+        """Devuelve la imagen guardada con ``clave`` o ``None`` si no está."""
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "rb") as f:
+                data = f.read()
+            os.utime(ruta)  # marcar como usada recientemente
+            # Sólo se lee la cabecera para conocer las dimensiones
+            width, height = Image.open(io.BytesIO(data)).size
+        except (OSError, ValueError):
+            return None
+        return ImagenPreparada(data, width, height)
+
+    def guardar(self, clave: str, imagen: ImagenPreparada) -> None:
+        """Guarda ``imagen``; los errores de disco se ignoran (la caché es opcional)."""
+        ruta = self._ruta(clave)
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(imagen.data)
+                os.replace(tmp, ruta)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            return
+        with self._lock:
+            if self._total is None:
+                self._total = sum(tam for _, _, tam in self._entradas())
+            else:
+                self._total += len(imagen.data)
+            if self._total > self.limite_bytes:
+                self._recortar()
+
+    def preparar(self, img_data: bytes, max_w: int, max_h: int, quality: int = 80) -> ImagenPreparada:
+        """``preparar_imagen`` pasando por la caché."""
+        clave = self.clave(img_data, max_w, max_h, quality)
+        imagen = self.obtener(clave)
+        if imagen is None:
+            imagen = preparar_imagen(img_data, max_w, max_h, quality)
+            self.guardar(clave, imagen)
+        return imagen
+
+    def _entradas(self) -> list[tuple[float, str, int]]:
+        """``(mtime, ruta, tamaño)`` de cada archivo de la caché."""
+        entradas = []
+        try:
+            subdirs = list(os.scandir(self.directorio))
+        except OSError:
+            return entradas
+        for sub in subdirs:
+            if not sub.is_dir():
+                continue
+            try:
+                with os.scandir(sub.path) as archivos:
+                    for a in archivos:
+                        if a.name.endswith(".jpg"):
+                            st = a.stat()
+                            entradas.append((st.st_mtime, a.path, st.st_size))
+            except OSError:
+                continue
+        return entradas
+
+    def _recortar(self) -> None:
+        # Se baja hasta el 90% del límite para no recorrer la carpeta en cada guardado
+        objetivo = self.limite_bytes * 0.9
+        entradas = sorted(self._entradas())
+        total = sum(tam for _, _, tam in entradas)
+        for _, ruta, tam in entradas:
+            if total <= objetivo:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            total -= tam
+        self._total = total
+
+    def __repr__(self) -> str:
+        return f"CacheImagenes({self.directorio!r})"
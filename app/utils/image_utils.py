@@ -0,0 +1,276 @@
+"""
+image_utils.py
+=================
+
+Preparación de las fotos que se insertan en los informes: decodificar,
+aplicar la orientación EXIF, reducir al tamaño de destino y recomprimir
+como JPEG.
+
+Las fotos de cámara (12-48 MP) se decodifican directamente a una escala
+reducida cercana al destino (``draft`` de PIL), sin pasar por la
+resolución completa.
+
+Ese trabajo es casi todo CPU, así que ``preparar_en_paralelo`` lo reparte
+en un pool de procesos y entrega los resultados en el mismo orden en que
+se pidieron, con un número acotado de fotos en vuelo para que la memoria
+no crezca con el tamaño del informe.
+
+Cuando una foto se necesita en varios tamaños (p. ej. para el PPTX y el
+XLSX), ``preparar_variantes`` la lee una sola vez y sólo la decodifica de
+nuevo si los tamaños piden escalas de decodificación distintas.
+
+Uso ejemplo:
+
+.. code-block:: python
+
+    datos = (_find_image_data(archivos, f) for f in fotos)
+    for foto, (imagen, error) in zip(fotos, preparar_en_paralelo(datos, 1600, 1600)):
+        if imagen:
+            slide.shapes.add_picture(io.BytesIO(imagen.data), ...)
+"""
+
+import io
+import math
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageOps
+
+from app.utils.procesos import crear_pool
+
+if TYPE_CHECKING:
+    from app.utils.image_cache import CacheImagenes
+
+
+@dataclass
+class ImagenPreparada:
+    """JPEG ya redimensionado, con sus dimensiones en píxeles."""
+
+    data: bytes
+    width: int
+    height: int
+
+
+# Tamaño máximo y calidad JPEG de un resultado: ``(max_w, max_h, quality)``
+Formato = Tuple[int, int, int]
+
+# Orientaciones EXIF que intercambian ancho y alto al aplicarse
+_ORIENTACIONES_ROTADAS = (5, 6, 7, 8)
+
+
+def _decodificar_reducida(img: Image.Image, max_w: int, max_h: int, holgura: float = 2.0) -> None:
+    """Pide al decodificador JPEG una escala reducida (1/2, 1/4 o 1/8).
+
+    Se calcula el tamaño final que tendrá la foto dentro de ``max_w`` x
+    ``max_h`` (teniendo en cuenta la rotación EXIF) y se decodifica a no
+    menos de ``holgura`` veces ese tamaño, para que la reducción final con
+    LANCZOS mantenga la calidad. Debe llamarse antes de cargar los píxeles;
+    en formatos distintos de JPEG no tiene efecto.
+    """
+    w, h = img.size
+    if img.getexif().get(0x0112) in _ORIENTACIONES_ROTADAS:
+        max_w, max_h = max_h, max_w
+    escala = min(max_w / w, max_h / h) * holgura
+    if escala < 1:
+        img.draft(None, (math.ceil(w * escala), math.ceil(h * escala)))
+
+
+def _comprimir(img: Image.Image, max_w: int, max_h: int, quality: int) -> ImagenPreparada:
+    # Redimensionar la imagen manteniendo la proporción
+    img.thumbnail((max_w, max_h), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return ImagenPreparada(buffer.getvalue(), img.width, img.height)
+
+
+def preparar_variantes(img_data: bytes, formatos: Sequence[Formato]) -> List[ImagenPreparada]:
+    """Prepara una foto en varios formatos, decodificándola lo menos posible.
+
+    Cada formato da el mismo resultado que ``preparar_imagen``: los
+    formatos que piden la misma escala de decodificación reducida
+    comparten una sola decodificación (y la orientación EXIF aplicada).
+
+    Args:
+        img_data: Bytes originales de la foto.
+        formatos: ``(max_w, max_h, quality)`` de cada resultado.
+
+    Returns:
+        Una imagen preparada por formato, en el mismo orden. Propaga las
+        excepciones de PIL si la foto no se puede leer.
+    """
+    # Abrir sólo lee la cabecera y ``draft`` ajusta el tamaño sin decodificar,
+    # así que se puede agrupar por escala antes de cargar los píxeles
+    por_escala: dict[tuple[int, int], tuple[Image.Image, list[int]]] = {}
+    for i, (max_w, max_h, _) in enumerate(formatos):
+        img = Image.open(io.BytesIO(img_data))
+        _decodificar_reducida(img, max_w, max_h)
+        por_escala.setdefault(img.size, (img, []))[1].append(i)
+
+    resultados: List[ImagenPreparada | None] = [None] * len(formatos)
+    for img, indices in por_escala.values():
+        img = ImageOps.exif_transpose(img)
+
+        # Asegurarse de que la imagen esté en el modo correcto
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGB")
+
+        for n, i in enumerate(indices):
+            variante = img if n == len(indices) - 1 else img.copy()
+            resultados[i] = _comprimir(variante, *formatos[i])
+    return resultados
+
+
+def preparar_imagen(img_data: bytes, max_w: int, max_h: int, quality: int = 80) -> ImagenPreparada:
+    """Decodifica, orienta, reduce a ``max_w`` x ``max_h`` y recomprime una foto.
+
+    Args:
+        img_data: Bytes originales de la foto.
+        max_w: Ancho máximo del resultado en píxeles.
+        max_h: Alto máximo del resultado en píxeles.
+        quality: Calidad JPEG del resultado.
+
+    Returns:
+        La imagen preparada. Propaga las excepciones de PIL si la foto no
+        se puede leer.
+    """
+    return preparar_variantes(img_data, [(max_w, max_h, quality)])[0]
+
+
+Resultado = Tuple[Optional[ImagenPreparada], Optional[Exception]]
+
+
+def _preparar_seguro(img_data: bytes, formatos: Sequence[Formato]) -> List[Resultado]:
+    try:
+        return [(imagen, None) for imagen in preparar_variantes(img_data, formatos)]
+    except Exception as e:
+        return [(None, e)] * len(formatos)
+
+
+def _resultados(futuro: Future, cantidad: int) -> List[Resultado]:
+    try:
+        return [(imagen, None) for imagen in futuro.result()]
+    except Exception as e:
+        return [(None, e)] * cantidad
+
+
+def preparar_en_paralelo(
+    datos: Iterable[bytes | Exception | None],
+    max_w: int,
+    max_h: int,
+    quality: int = 80,
+    max_workers: int | None = None,
+    ventana: int | None = None,
+    cache: "CacheImagenes | None" = None,
+) -> Iterator[Resultado]:
+    """Prepara una secuencia de fotos en un pool de procesos.
+
+    ``datos`` se consume de forma perezosa: sólo se leen (y se mantienen en
+    memoria) las fotos que están dentro de la ventana de trabajo.
+
+    Args:
+        datos: Bytes de cada foto en el orden de uso; ``None`` si falta o la
+            excepción que impidió leerla del origen.
+        max_w: Ancho máximo de cada resultado.
+        max_h: Alto máximo de cada resultado.
+        quality: Calidad JPEG.
+        max_workers: Procesos del pool. Con 1 se trabaja en el hilo actual.
+            Por defecto, la cantidad de núcleos.
+        ventana: Máximo de fotos en vuelo. Por defecto, ``2 * max_workers``.
+        cache: Caché en disco opcional (``image_cache.CacheImagenes``). Las
+            fotos que ya están en ella no se vuelven a procesar y las nuevas
+            se guardan al terminar.
+
+    Yields:
+        ``(imagen, error)`` por cada elemento de ``datos`` y en el mismo
+        orden: ``(None, None)`` si faltaban los bytes y ``(None, excepción)``
+        si la foto no se pudo leer o procesar.
+    """
+    for (resultado,) in preparar_variantes_en_paralelo(datos, [(max_w, max_h, quality)],
+                                                      max_workers, ventana, cache):
+        yield resultado
+
+
+def preparar_variantes_en_paralelo(
+    datos: Iterable[bytes | Exception | None],
+    formatos: Sequence[Formato],
+    max_workers: int | None = None,
+    ventana: int | None = None,
+    cache: "CacheImagenes | None" = None,
+) -> Iterator[List[Resultado]]:
+    """Como ``preparar_en_paralelo``, pero cada foto en todos los ``formatos``.
+
+    Cada foto se lee una vez y se prepara con ``preparar_variantes``; con
+    ``cache`` sólo se procesan los formatos que faltan en ella.
+
+    Yields:
+        Por cada elemento de ``datos``, la lista de ``(imagen, error)`` de
+        cada formato, en el orden de ``formatos``.
+    """
+    formatos = list(formatos)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    # El pool se crea con la primera foto que hay que procesar: si todas
+    # están en la caché no se arranca ningún proceso.
+    pool: ProcessPoolExecutor | None = None
+
+    def _pedir(img_data: bytes | Exception | None):
+        """``(claves, ya cacheadas, trabajo)``; el trabajo es un Future o la lista de resultados."""
+        if isinstance(img_data, Exception):
+            return [(None, img_data)] * len(formatos)
+        if not img_data:
+            return None
+        claves = [cache.clave(img_data, *f) if cache is not None else None for f in formatos]
+        listas = [cache.obtener(c) if c is not None else None for c in claves]
+        faltan = [f for f, imagen in zip(formatos, listas) if imagen is None]
+        trabajo = None
+        if faltan:
+            if max_workers <= 1:
+                trabajo = _preparar_seguro(img_data, faltan)
+            else:
+                nonlocal pool
+                if pool is None:
+                    pool = crear_pool(max_workers)
+                trabajo = pool.submit(preparar_variantes, img_data, faltan)
+        return claves, listas, trabajo, len(faltan)
+
+    def _entregar(pedido) -> List[Resultado]:
+        if pedido is None:
+            return [(None, None)] * len(formatos)
+        if isinstance(pedido, list):
+            return pedido
+        claves, listas, trabajo, cantidad = pedido
+        if isinstance(trabajo, Future):
+            trabajo = _resultados(trabajo, cantidad)
+        nuevos = iter(trabajo or ())
+        resultados = []
+        for clave, imagen in zip(claves, listas):
+            if imagen is not None:
+                resultados.append((imagen, None))
+                continue
+            imagen, error = next(nuevos)
+            if imagen is not None and clave is not None:
+                cache.guardar(clave, imagen)
+            resultados.append((imagen, error))
+        return resultados
+
+    if max_workers <= 1:
+        for img_data in datos:
+            yield _entregar(_pedir(img_data))
+        return
+
+    ventana = ventana or 2 * max_workers
+    try:
+        pendientes: deque = deque()
+        for img_data in datos:
+            pendientes.append(_pedir(img_data))
+            if len(pendientes) >= ventana:
+                yield _entregar(pendientes.popleft())
+        while pendientes:
+            yield _entregar(pendientes.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
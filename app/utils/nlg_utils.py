@@ -50,8 +50,12 @@ modelos de aprendizaje automático. Está pensada para ofrecer
 transparencia, control y facilidad de mantenimiento.
 """
 
+import heapq
+import math
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
 from difflib import SequenceMatcher
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 
 def _normaliza_descripcion(texto: str) -> str:
@@ -71,15 +75,87 @@ def _normaliza_descripcion(texto: str) -> str:
     return " ".join(texto.lower().split())
 
 
+class _IndiceReferencias:
+    """Referencias normalizadas de los grupos, indexadas por longitud.
+
+    ``buscar`` devuelve el primer grupo (en orden de creación) cuya
+    referencia alcanza el umbral con ``SequenceMatcher.ratio``, igual que
+    compararlas todas una por una, pero descartando antes los grupos con
+    cotas superiores baratas de ``ratio``: la de longitudes (la misma de
+    ``real_quick_ratio``) y la de caracteres en común (``quick_ratio``).
+    Sólo se calcula ``ratio`` para los grupos que pasan ambas.
+    """
+
+    def __init__(self, umbral_similitud: float):
+        self.umbral = umbral_similitud
+        # Un SequenceMatcher por grupo con la referencia como ``b``: su
+        # análisis (la parte cara) se hace una sola vez
+        self._comparadores: List[SequenceMatcher] = []
+        self._conteos: List[Counter] = []
+        self._por_longitud: Dict[int, List[int]] = {}
+        self._longitudes: List[int] = []  # claves de ``_por_longitud``, ordenadas
+
+    def agregar(self, referencia_norm: str) -> int:
+        indice = len(self._comparadores)
+        self._comparadores.append(SequenceMatcher(None, "", referencia_norm))
+        self._conteos.append(Counter(referencia_norm))
+        longitud = len(referencia_norm)
+        if longitud not in self._por_longitud:
+            self._por_longitud[longitud] = []
+            insort(self._longitudes, longitud)
+        self._por_longitud[longitud].append(indice)
+        return indice
+
+    def _candidatos(self, la: int) -> Iterable[int]:
+        """Grupos cuya longitud permite alcanzar el umbral, en orden de creación."""
+        if self.umbral <= 0:
+            desde, hasta = 0, self._longitudes[-1] if self._longitudes else 0
+        else:
+            # 2·min(la, lb) / (la + lb) >= umbral  (con un margen por redondeo)
+            desde = math.floor(la * self.umbral / (2 - self.umbral)) - 1
+            hasta = math.ceil(la * (2 - self.umbral) / self.umbral) + 1
+        i = bisect_left(self._longitudes, desde)
+        j = bisect_right(self._longitudes, hasta)
+        return heapq.merge(*(self._por_longitud[lb] for lb in self._longitudes[i:j]))
+
+    def buscar(self, desc_norm: str) -> Optional[int]:
+        if self.umbral > 1:
+            return None  # ``ratio`` nunca supera 1
+        la = len(desc_norm)
+        conteo = None
+        for indice in self._candidatos(la):
+            comparador = self._comparadores[indice]
+            total = la + len(comparador.b)
+            if total:
+                if 2.0 * min(la, len(comparador.b)) / total < self.umbral:
+                    continue
+                if conteo is None:
+                    conteo = Counter(desc_norm)
+                comunes = sum((conteo & self._conteos[indice]).values())
+                if 2.0 * comunes / total < self.umbral:
+                    continue
+            comparador.set_seq1(desc_norm)
+            if comparador.ratio() >= self.umbral:
+                return indice
+        return None
+
+
 def agrupar_descripciones(
-    entradas: List[Tuple[str, str]], umbral_similitud: float = 0.8
+    entradas: List[Tuple[str, str]], umbral_similitud: float = 0.8,
+    cache: Optional["CacheRedaccion"] = None,
 ) -> List[Dict[str, List[str]]]:
     """Agrupa descripciones similares según un umbral de similitud.
 
     Cada entrada es una tupla ``(descripcion, variable)``. La
     función agrupa las descripciones que alcanzan o superan el
     umbral de similitud utilizando ``SequenceMatcher.ratio``. La
-    primera descripción de un grupo se toma como referencia.
+    primera descripción de un grupo se toma como referencia, y cada
+    descripción se asigna al primer grupo (en orden de creación) que
+    alcanza el umbral.
+
+    Las referencias se normalizan una sola vez y se indexan (ver
+    ``_IndiceReferencias``); las descripciones repetidas se resuelven
+    sin volver a comparar.
 
     Args:
         entradas: Una lista de pares donde el primer elemento es la
@@ -89,6 +165,8 @@ def agrupar_descripciones(
             de qué similitud dos descripciones se consideran del
             mismo grupo. Un valor más alto resulta en grupos más
             estrictos.
+        cache: ``CacheRedaccion`` opcional donde buscar (y guardar)
+            el agrupamiento de estas descripciones.
 
     Returns:
         Una lista de diccionarios. Cada diccionario tiene las
@@ -96,22 +174,72 @@ def agrupar_descripciones(
         grupo) y ``"variables"`` (lista de variables asociadas a
         las entradas del grupo).
     """
+    descripciones = [_normaliza_descripcion(d) for d, _ in entradas]
+    if cache is not None:
+        asignaciones = cache.asignaciones(descripciones, umbral_similitud)
+    else:
+        asignaciones = _asignar_grupos(descripciones, umbral_similitud)
+
     grupos: List[Dict[str, List[str]]] = []
-    for descripcion, variable in entradas:
-        desc_norm = _normaliza_descripcion(descripcion)
-        asignado = False
-        for grupo in grupos:
-            referencia_norm = _normaliza_descripcion(grupo["descripcion"])
-            similitud = SequenceMatcher(None, desc_norm, referencia_norm).ratio()
-            if similitud >= umbral_similitud:
-                grupo["variables"].append(variable)
-                asignado = True
-                break
-        if not asignado:
-            grupos.append({"descripcion": descripcion, "variables": [variable]})
+    for (descripcion, variable), i in zip(entradas, asignaciones):
+        if i == len(grupos):
+            grupos.append({"descripcion": descripcion, "variables": []})
+        grupos[i]["variables"].append(variable)
     return grupos
 
 
+def _asignar_grupos(descripciones_norm: List[str], umbral_similitud: float) -> List[int]:
+    """Índice del grupo de cada descripción ya normalizada.
+
+    Los grupos se numeran en orden de creación, así que una descripción
+    que abre un grupo nuevo recibe el índice siguiente al mayor asignado.
+    """
+    indice = _IndiceReferencias(umbral_similitud)
+    # Grupo ya resuelto para cada descripción normalizada. Vale porque las
+    # referencias no cambian y una descripción siempre alcanza el umbral
+    # contra sí misma (si el umbral no pasa de 1).
+    resueltas: Dict[str, int] = {}
+    asignaciones = []
+    for desc_norm in descripciones_norm:
+        i = resueltas.get(desc_norm)
+        if i is None:
+            i = indice.buscar(desc_norm)
+        if i is None:
+            i = indice.agregar(desc_norm)
+        asignaciones.append(i)
+        if umbral_similitud <= 1:
+            resueltas[desc_norm] = i
+    return asignaciones
+
+
+class CacheRedaccion:
+    """Agrupamientos ya calculados, para reutilizarlos entre informes.
+
+    El agrupamiento sólo depende de las descripciones normalizadas y del
+    umbral (no de las variables), así que el PPTX y el XLSX de un mismo
+    proyecto, o varias exportaciones seguidas, lo calculan una sola vez
+    para cada lista de descripciones. Se pasa como ``cache`` a
+    ``agrupa_y_redacta``; conviene una instancia por proyecto o sesión.
+    """
+
+    def __init__(self):
+        self._asignaciones: Dict[Tuple[Tuple[str, ...], float], Tuple[int, ...]] = {}
+
+    def asignaciones(self, descripciones_norm: List[str], umbral_similitud: float) -> Tuple[int, ...]:
+        clave = (tuple(descripciones_norm), umbral_similitud)
+        resultado = self._asignaciones.get(clave)
+        if resultado is None:
+            resultado = tuple(_asignar_grupos(descripciones_norm, umbral_similitud))
+            self._asignaciones[clave] = resultado
+        return resultado
+
+    def clear(self) -> None:
+        self._asignaciones.clear()
+
+    def __len__(self) -> int:
+        return len(self._asignaciones)
+
+
 def _seleccionar_plantilla(descripcion: str) -> str:
     """Devuelve una plantilla de oración según la descripción.
 
@@ -192,7 +320,8 @@ def redactar_oracion(grupo: Dict[str, List[str]]) -> str:
 
 
 def agrupa_y_redacta(
-    entradas: List[Tuple[str, str]], umbral_similitud: float = 0.8
+    entradas: List[Tuple[str, str]], umbral_similitud: float = 0.8,
+    cache: Optional[CacheRedaccion] = None,
 ) -> List[str]:
     """Agrupa entradas similares y genera oraciones para cada grupo.
 
@@ -213,10 +342,12 @@ def agrupa_y_redacta(
             agrupar descripciones. El valor por defecto es 0.8,
             recomendado en el informe. Ajuste este valor según
             la tolerancia a variaciones de su conjunto de datos.
+        cache: ``CacheRedaccion`` opcional compartida entre llamadas
+            (ver ``agrupar_descripciones``).
 
     Returns:
         Una lista de oraciones en castellano que resumen los
         hallazgos agrupados.
     """
-    grupos = agrupar_descripciones(entradas, umbral_similitud)
+    grupos = agrupar_descripciones(entradas, umbral_similitud, cache)
     return [redactar_oracion(gr) for gr in grupos]
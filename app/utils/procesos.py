@@ -0,0 +1,30 @@
+"""
+procesos.py
+=================
+
+Pool de procesos común a la ingesta, la preparación de fotos y los lotes.
+
+Los pools se arrancan desde hilos de trabajo de Qt (``QThread``). En Linux
+el método de arranque por defecto es ``fork``, que copia un proceso con
+varios hilos en marcha y puede dejar al hijo bloqueado en un lock que
+tenía otro hilo. Por eso todos los pools usan ``spawn``, igual que en
+Windows: cada proceso arranca un intérprete limpio y recibe el trabajo
+(y los argumentos de ``initializer``) serializados con pickle.
+
+Uso ejemplo:
+
+.. code-block:: python
+
+    with crear_pool(max_workers=4) as pool:
+        futuro = pool.submit(funcion, argumento)
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+
+def crear_pool(max_workers: int | None = None, initializer: Callable | None = None,
+               initargs: tuple = ()) -> ProcessPoolExecutor:
+    """``ProcessPoolExecutor`` con procesos arrancados por ``spawn``."""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=initializer, initargs=initargs)
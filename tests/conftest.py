@@ -0,0 +1,44 @@
+import io
+import zipfile
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+
+def _jpeg(color, size=(320, 240)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def jpeg():
+    """Devuelve una función que genera un JPEG liso de ``color`` y ``size``."""
+    return _jpeg
+
+
+@pytest.fixture
+def crear_proyecto(tmp_path):
+    """Crea un ZIP de proyecto con ``n`` fotos repartidas en dos grupos y devuelve su ruta."""
+    grupos_txt = (RAIZ / "grupos.txt").read_bytes()
+
+    def _crear(nombre: str, n: int = 4) -> str:
+        archivos, desc = {}, []
+        for i in range(n):
+            carpeta = f"Piso {i % 2 + 1}"
+            archivo = f"{nombre}_{i:02d}.jpg"
+            archivos[f"{carpeta}/{archivo}"] = _jpeg((i * 40 % 255, 90, 160))
+            codigo = "1.1.1" if i % 2 else "1.1.2"
+            desc.append(f"[{carpeta}] {archivo}\nDescription: {codigo} Extintor sin señalización {i}\n")
+        archivos["descriptions.txt"] = "".join(desc).encode("utf-8")
+        archivos["grupos.txt"] = grupos_txt
+        ruta = tmp_path / f"{nombre}.zip"
+        with zipfile.ZipFile(ruta, "w") as z:
+            for clave, datos in archivos.items():
+                z.writestr(clave, datos)
+        return str(ruta)
+
+    return _crear
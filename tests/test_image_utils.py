@@ -0,0 +1,26 @@
+from app.utils.image_utils import preparar_en_paralelo, preparar_variantes_en_paralelo
+
+
+def _claves(resultados):
+    return [(imagen.data, imagen.width, imagen.height) if imagen else (None, type(error)) for imagen, error in resultados]
+
+
+def test_preparar_en_paralelo_igual_que_secuencial(jpeg):
+    datos = [jpeg((i * 30, 80, 120), (640, 480)) for i in range(5)] + [None, b"no es una imagen"]
+
+    secuencial = list(preparar_en_paralelo(datos, 200, 200, max_workers=1))
+    paralelo = list(preparar_en_paralelo(datos, 200, 200, max_workers=2))
+
+    assert _claves(paralelo) == _claves(secuencial)
+    assert paralelo[5] == (None, None)
+    assert paralelo[6][0] is None and paralelo[6][1] is not None
+
+
+def test_preparar_variantes_en_paralelo_mantiene_el_orden(jpeg):
+    datos = [jpeg((i * 30, 80, 120), (640, 480)) for i in range(4)]
+    formatos = [(300, 300, 80), (100, 100, 80)]
+
+    secuencial = list(preparar_variantes_en_paralelo(datos, formatos, max_workers=1))
+    paralelo = list(preparar_variantes_en_paralelo(datos, formatos, max_workers=2, ventana=2))
+
+    assert [_claves(r) for r in paralelo] == [_claves(r) for r in secuencial]
@@ -0,0 +1,83 @@
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+from app.utils.nlg_utils import CacheRedaccion, _normaliza_descripcion, agrupa_y_redacta, redactar_oracion
+
+BASES = [
+    "Extintor sin señalización",
+    "extintor sin senalizacion",
+    "Luz de emergencia inoperativa",
+    "Puerta abre en sentido contrario + puerta principal",
+    "puerta abre en sentido contrario + puerta principal.",
+    "Fisura longitudinal de 10 cm",
+    "fisura long. de 8 cm",
+    "IG: falta de tornillos",
+    "IG falta de sujetadores",
+    "",
+    "  ",
+    "a",
+    "ab",
+    # Más de 200 caracteres: SequenceMatcher aplica su heurística de "junk"
+    "Tablero eléctrico sin rotulación de circuitos, " * 6,
+    "Tablero electrico sin rotulacion de circuitos; " * 6,
+]
+
+# Además de los habituales: los extremos, valores fuera de rango y ratios
+# exactos (2/3, 3/4...) donde una cota con redondeo podría fallar por poco.
+UMBRALES = [-0.5, 0.0, 0.2, 0.35, 0.5, 2 / 3, 0.75, 0.8, 0.9, 1.0, 1.5]
+
+
+def _agrupa_y_redacta_referencia(entradas, umbral):
+    """Comparación de cada descripción contra todas las referencias, en orden."""
+    grupos = []
+    for descripcion, variable in entradas:
+        desc_norm = _normaliza_descripcion(descripcion)
+        for grupo in grupos:
+            referencia = _normaliza_descripcion(grupo["descripcion"])
+            if SequenceMatcher(None, desc_norm, referencia).ratio() >= umbral:
+                grupo["variables"].append(variable)
+                break
+        else:
+            grupos.append({"descripcion": descripcion, "variables": [variable]})
+    return [redactar_oracion(g) for g in grupos]
+
+
+def _variante(rnd, texto):
+    letras = list(texto)
+    for _ in range(rnd.randint(0, 4)):
+        pos = rnd.randrange(len(letras) + 1)
+        if rnd.random() < 0.5 and pos < len(letras):
+            del letras[pos]
+        else:
+            letras.insert(pos, rnd.choice("aeiou .,XY"))
+    return "".join(letras)
+
+
+def _casos():
+    rnd = random.Random(23)
+    casos = [[(b, f"Piso {i}") for i, b in enumerate(BASES)]]
+    for _ in range(80):
+        n = rnd.randint(1, 25)
+        casos.append([(_variante(rnd, rnd.choice(BASES)), f"Carpeta {rnd.randint(1, 6)}") for _ in range(n)])
+    return casos
+
+
+@pytest.mark.parametrize("umbral", UMBRALES)
+def test_agrupa_y_redacta_igual_que_comparar_todas(umbral):
+    cache = CacheRedaccion()
+    for entradas in _casos():
+        esperado = _agrupa_y_redacta_referencia(entradas, umbral)
+        assert agrupa_y_redacta(entradas, umbral_similitud=umbral) == esperado
+        assert agrupa_y_redacta(entradas, umbral_similitud=umbral, cache=cache) == esperado
+        # Segunda vez: sale de la caché
+        assert agrupa_y_redacta(entradas, umbral_similitud=umbral, cache=cache) == esperado
+
+
+def test_cache_compartida_entre_umbrales():
+    cache = CacheRedaccion()
+    entradas = _casos()[0]
+    for umbral in UMBRALES + UMBRALES[::-1]:
+        assert agrupa_y_redacta(entradas, umbral, cache=cache) == _agrupa_y_redacta_referencia(entradas, umbral)
+    assert len(cache) == len(UMBRALES)
@@ -0,0 +1,44 @@
+import zipfile
+
+from app.core.processing import _leer_lineas, procesar_fuentes
+from app.core.sources import ZipSource
+
+
+def _resumen(grupos):
+    return {clave: [(f.filename, f.carpeta, f.detalle, f.archive_key) for f in g.fotos]
+            for clave, g in grupos.items()}
+
+
+def test_procesar_fuentes_en_paralelo_igual_que_secuencial(crear_proyecto):
+    paths = [crear_proyecto("a", 4), crear_proyecto("b", 3), crear_proyecto("c", 5)]
+
+    grupos_seq, archivos_seq, errores_seq = procesar_fuentes(paths, max_workers=1)
+    grupos_par, archivos_par, errores_par = procesar_fuentes(paths, max_workers=2)
+    try:
+        assert list(grupos_par) == list(grupos_seq)
+        assert _resumen(grupos_par) == _resumen(grupos_seq)
+        assert sum(len(g.fotos) for g in grupos_par.values()) == 12
+        assert errores_par == errores_seq
+        assert sorted(archivos_par.keys()) == sorted(archivos_seq.keys())
+        foto = next(iter(grupos_par.values())).fotos[0]
+        assert archivos_par[foto.archive_key] == archivos_seq[foto.archive_key]
+    finally:
+        archivos_seq.close()
+        archivos_par.close()
+
+
+def test_leer_lineas_corta_como_splitlines(tmp_path):
+    texto = ("[Piso 1] a.jpg\r\nDescription: 1.1.1 uno\x0bdos\n\n[Piso 2] b.jpg\rDescription: 1.1.2 tres\x0c"
+             "cuatro\x1c\x1d\x1e\x85cinco seis siete\r\n\r\nfin sin salto")
+    datos = texto.encode("utf-8") + b"\xff"
+    ruta = tmp_path / "p.zip"
+    with zipfile.ZipFile(ruta, "w") as z:
+        z.writestr("descriptions.txt", datos)
+
+    esperado = datos.decode("utf-8", errors="ignore").splitlines()
+    assert list(_leer_lineas({"descriptions.txt": datos}, "descriptions.txt")) == esperado
+    fuente = ZipSource(str(ruta))
+    try:
+        assert list(_leer_lineas(fuente, "descriptions.txt")) == esperado
+    finally:
+        fuente.close()
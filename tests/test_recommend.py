@@ -0,0 +1,136 @@
+import math
+import random
+from difflib import SequenceMatcher
+
+import pandas as pd
+import pytest
+
+from app.core.recommend import RecConfig, _norm, _tokens, load_engine
+
+# Histórico de prueba: tags repetidos, tags que sólo difieren en mayúsculas o
+# tildes (empatan), filas sin observación (puntaje fijo 0.1) y
+# recomendaciones repetidas dentro de un mismo tag.
+FILAS = [
+    ("Extintor sin señalización", "Extintor", "Colocar señal de extintor", "RNE"),
+    ("Extintor vencido en pasillo", "Extintor", "Recargar el extintor", "RNE"),
+    ("", "Extintor", "Revisar extintores", ""),
+    ("Extintor obstruido", "extintor", "Despejar el acceso al extintor", ""),
+    ("Luz de emergencia inoperativa", "Luz de emergencia", "Reparar la luz de emergencia", "RNE"),
+    ("Luz de emergencia sin batería", "Luz de emergencia", "Reparar la luz de emergencia", ""),
+    ("Luminaria rota", "Luz", "Cambiar la luminaria", ""),
+    ("Puerta abre en sentido contrario", "Puerta de evacuación", "Invertir el sentido de apertura", "A.130"),
+    ("Puerta con cerrojo", "Puerta de evacuacion", "Retirar el cerrojo", "A.130"),
+    ("Pasadizo con obstáculos", "Medios de evacuación", "Liberar el pasadizo", "A.010"),
+    ("Escalera sin pasamanos", "Medios de evacuación", "Instalar pasamanos", "A.010"),
+    ("", "Medios de evacuación", "Señalizar la ruta", ""),
+    ("Tablero sin rotular", "Tablero eléctrico", "Rotular los circuitos", "CNE"),
+    ("Tablero sin tapa", "Tablero eléctrico", "", "CNE"),
+    ("Cables expuestos", "Instalaciones eléctricas", "Entubar los cables", "CNE"),
+    ("Tomacorriente sin línea a tierra", "Instalaciones eléctricas", "Instalar pozo a tierra", "CNE"),
+]
+
+PALABRAS = ["extintor", "luz", "emergencia", "puerta", "evacuación", "tablero", "eléctrico",
+            "cables", "pasadizo", "escalera", "señal", "sin", "de", "la", "inoperativa", "Luz"]
+
+CONFIGS = [
+    RecConfig(),
+    RecConfig(min_score=0.0, top_k=5, stopwords={"de", "la", "sin"}, keyword_boost={"extintor": 0.05}),
+]
+
+
+def _suggest_referencia(filas, cfg, query, extra_text="", top_k=None, min_score=None):
+    """``suggest`` recorriendo todos los tags y filas, sin índices ni cotas."""
+    top_k = cfg.top_k if top_k is None else top_k
+    min_score = cfg.min_score if min_score is None else min_score
+    stop = cfg.stopwords or set()
+
+    q_tag = {t for t in _tokens(query) if t not in stop}
+    best_score, best_tag = -1.0, ""
+    for obs, tag, rec, src in filas:
+        tok_tag = {t for t in _tokens(tag) if t not in stop}
+        diff = SequenceMatcher(None, _norm(query), _norm(tag)).ratio()
+        j = len(q_tag & tok_tag) / (len(q_tag | tok_tag) or 1)
+        score = 0.7 * diff + 0.3 * j
+        if score > best_score:
+            best_score, best_tag = score, tag
+    if best_score < 0.35:
+        return []
+
+    q_obs = {t for t in _tokens(f"{query} {extra_text}".strip()) if t not in stop}
+    out = []
+    for obs, tag, rec, src in filas:
+        if tag != best_tag:
+            continue
+        if not obs:
+            score = 0.1
+        else:
+            tok_obs = {t for t in _tokens(obs) if t not in stop}
+            j = len(q_obs & tok_obs) / (len(q_obs | tok_obs) or 1)
+            diff = SequenceMatcher(None, _norm(extra_text or query), _norm(obs)).ratio()
+            score = 0.6 * j + 0.4 * diff
+        for kw, bonus in (cfg.keyword_boost or {}).items():
+            if kw in q_obs:
+                score += bonus
+        if rec and score >= min_score:
+            out.append((score, rec))
+    vistos = {}
+    for score, rec in sorted(out, key=lambda x: x[0], reverse=True):
+        vistos.setdefault(rec, score)
+    return [(s, r) for r, s in sorted(vistos.items(), key=lambda x: x[1], reverse=True)[:top_k]]
+
+
+@pytest.fixture
+def historico(tmp_path):
+    ruta = tmp_path / "historico.csv"
+    df = pd.DataFrame(FILAS, columns=["OBSERVACION", "TAG", "RECOMENDACIÓN", "FUENTE"])
+    df.to_csv(ruta, sep=";", encoding="latin1", index=False)
+    return str(ruta)
+
+
+def _consultas():
+    rnd = random.Random(9)
+    consultas = [("", ""), ("Extintor", ""), ("extintor", ""), ("EXTINTÓR", "vencido"),
+                 ("Luz", ""), ("Luz de emergencia", "sin batería"), ("Puerta de evacuación", ""),
+                 ("Tablero eléctrico", "sin tapa"), ("zzz", ""), ("de la", "")]
+    consultas += [(tag, obs) for obs, tag, _, _ in FILAS]
+    tags = sorted({tag for _, tag, _, _ in FILAS})
+    for _ in range(300):
+        query = " ".join(rnd.sample(PALABRAS, rnd.randint(1, 4)))
+        extra = " ".join(rnd.sample(PALABRAS, rnd.randint(0, 3)))
+        consultas.append((query, extra))
+    # Tags con erratas y recortes: puntajes cercanos entre varios tags, donde
+    # una cota mal calculada descartaría al ganador
+    for _ in range(300):
+        query = list(rnd.choice(tags))
+        for _ in range(rnd.randint(0, 6)):
+            pos = rnd.randrange(len(query) + 1)
+            accion = rnd.random()
+            if accion < 0.4 and pos < len(query):
+                del query[pos]
+            elif accion < 0.8:
+                query.insert(pos, rnd.choice("aeiouxyz "))
+            else:
+                query = query[pos:] or query
+        consultas.append(("".join(query), ""))
+    return consultas
+
+
+@pytest.mark.parametrize("cfg", CONFIGS, ids=["defecto", "stopwords_y_boost"])
+def test_suggest_igual_que_recorrer_todos_los_tags(historico, cfg):
+    engine = load_engine(historico, cfg)
+    filas = [tuple(r) for r in pd.read_csv(historico, sep=";", encoding="latin1").fillna("").astype(str).values]
+    for query, extra in _consultas():
+        assert engine.suggest(query, extra_text=extra) == _suggest_referencia(filas, cfg, query, extra), (query, extra)
+
+
+def test_suggest_min_score_en_el_borde(historico):
+    cfg = RecConfig(top_k=10)
+    engine = load_engine(historico, cfg)
+    filas = [tuple(r) for r in pd.read_csv(historico, sep=";", encoding="latin1").fillna("").astype(str).values]
+    for query, extra in [("Extintor", "vencido"), ("Medios de evacuación", "pasadizo"), ("Luz de emergencia", "")]:
+        puntajes = {s for s, _ in _suggest_referencia(filas, cfg, query, extra, min_score=0.0)}
+        # 0.1 es el puntaje fijo de las filas sin observación
+        for borde in sorted(puntajes | {0.1}):
+            for min_score in (borde, math.nextafter(borde, 1.0), math.nextafter(borde, 0.0)):
+                esperado = _suggest_referencia(filas, cfg, query, extra, min_score=min_score)
+                assert engine.suggest(query, extra_text=extra, min_score=min_score) == esperado
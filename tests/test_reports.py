@@ -0,0 +1,126 @@
+import copy
+import tempfile
+import zipfile
+from pathlib import Path
+
+import pytest
+from openpyxl import load_workbook
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+from app.core.processing import procesar_fuentes
+from app.report.plan import ReportPlan
+from app.report.pptx_writer import export_plan_to_pptx_report
+from app.report.xlsx_writer import export_plan_to_xlsx_report
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def plan(crear_proyecto, monkeypatch):
+    # Los escritores leen la portada y el logo de ``datos/`` con rutas relativas
+    monkeypatch.chdir(RAIZ)
+    grupos, archivos, errores = procesar_fuentes([crear_proyecto("a", 14), crear_proyecto("b", 5)], max_workers=1)
+    assert not errores
+    plan = ReportPlan(grupos, archivos)
+    yield plan
+    plan.close()
+    archivos.close()
+
+
+def _medios(path):
+    with zipfile.ZipFile(path) as z:
+        return sorted(z.read(n) for n in z.namelist() if "/media/" in n)
+
+
+def _resumen_pptx(path):
+    prs = Presentation(path)
+    diapositivas = []
+    for slide in prs.slides:
+        formas = []
+        for shape in slide.shapes:
+            forma = [shape.shape_type, shape.left, shape.top, shape.width, shape.height]
+            if shape.has_text_frame:
+                forma.append(shape.text_frame.text)
+            if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
+                forma += [shape.image.sha1, shape.image.size, shape.crop_left, shape.crop_right]
+            formas.append(forma)
+        diapositivas.append(formas)
+    return (prs.slide_width, prs.slide_height), diapositivas
+
+
+def _resumen_xlsx(path):
+    wb = load_workbook(path)
+    hojas = {}
+    for ws in wb.worksheets:
+        # copy() desenvuelve los StyleProxy, que no se comparan entre sí
+        celdas = {c.coordinate: (c.value, *map(copy.copy, (c.font, c.fill, c.border, c.alignment)), c.number_format)
+                  for fila in ws.iter_rows() for c in fila if c.value is not None or c.has_style}
+        hojas[ws.title] = {
+            "celdas": celdas,
+            "combinadas": sorted(str(r) for r in ws.merged_cells.ranges),
+            "filas": {k: d.height for k, d in ws.row_dimensions.items() if d.height},
+            "columnas": {k: d.width for k, d in ws.column_dimensions.items()},
+            "pagina": (ws.page_setup.orientation, ws.page_setup.paperSize, ws.page_setup.fitToWidth,
+                       ws.page_setup.fitToHeight, ws.page_margins, ws.sheet_properties, ws.print_area),
+            "imagenes": [(img.width, img.height, getattr(img.anchor, "_from", None)) for img in ws._images],
+        }
+    return list(wb.sheetnames), hojas
+
+
+def test_xlsx_bajo_consumo_igual_al_normal(plan, tmp_path):
+    normal, bajo = tmp_path / "normal.xlsx", tmp_path / "bajo.xlsx"
+    export_plan_to_xlsx_report(plan, str(normal), control_documents={1: "CORRECTO"}, max_workers=1)
+    export_plan_to_xlsx_report(plan, str(bajo), control_documents={1: "CORRECTO"}, max_workers=1, low_memory=True)
+
+    assert _resumen_xlsx(bajo) == _resumen_xlsx(normal)
+    assert _medios(bajo) == _medios(normal)
+
+
+def test_pptx_bajo_consumo_igual_al_normal(plan, tmp_path):
+    normal, bajo = tmp_path / "normal.pptx", tmp_path / "bajo.pptx"
+    export_plan_to_pptx_report(plan, str(normal), max_workers=1)
+    export_plan_to_pptx_report(plan, str(bajo), max_workers=1, low_memory=True)
+
+    assert _resumen_pptx(bajo) == _resumen_pptx(normal)
+    assert _medios(bajo) == _medios(normal)
+
+
+def test_foto_danada_en_el_zip_no_corta_los_informes(crear_proyecto, monkeypatch, tmp_path):
+    monkeypatch.chdir(RAIZ)
+    ruta = Path(crear_proyecto("a", 4))
+    with zipfile.ZipFile(ruta) as z:
+        info = z.getinfo("Piso 1/a_00.jpg")
+        contenido = z.read(info)
+    # Cambiar un byte del miembro (guardado sin comprimir): el CRC deja de coincidir
+    crudo = bytearray(ruta.read_bytes())
+    inicio = crudo.index(contenido)
+    crudo[inicio + len(contenido) // 2] ^= 0xFF
+    ruta.write_bytes(bytes(crudo))
+
+    grupos, archivos, errores = procesar_fuentes([str(ruta)], max_workers=1)
+    assert not errores
+    plan = ReportPlan(grupos, archivos)
+    try:
+        export_plan_to_pptx_report(plan, str(tmp_path / "informe.pptx"), max_workers=1)
+        export_plan_to_xlsx_report(plan, str(tmp_path / "informe.xlsx"), max_workers=1)
+    finally:
+        plan.close()
+        archivos.close()
+
+    wb = load_workbook(tmp_path / "informe.xlsx")
+    textos = {c.value for ws in wb.worksheets for fila in ws.iter_rows() for c in fila}
+    assert "Piso 1/a_00.jpg" in textos
+    fotos = [sh for slide in Presentation(tmp_path / "informe.pptx").slides for sh in slide.shapes
+             if sh.shape_type == MSO_SHAPE_TYPE.PICTURE]
+    assert len(fotos) == 3
+
+
+def test_pptx_bajo_consumo_borra_temporales_si_falla_el_guardado(plan, tmp_path, monkeypatch):
+    temporales = tmp_path / "tmp"
+    temporales.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(temporales))
+
+    with pytest.raises(OSError):
+        export_plan_to_pptx_report(plan, str(tmp_path / "no_existe" / "informe.pptx"), max_workers=1, low_memory=True)
+    assert list(temporales.iterdir()) == []
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from app.core.sources import CombinedSource, ZipSource
+
+
+def _abiertos(path):
+    """Descriptores del proceso que apuntan a ``path`` (sólo Linux)."""
+    fds = "/proc/self/fd"
+    return sum(1 for fd in os.listdir(fds) if os.path.realpath(os.path.join(fds, fd)) == path)
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="usa /proc para contar descriptores")
+def test_zipsource_close_libera_el_archivo_y_se_reabre(crear_proyecto):
+    ruta = os.path.realpath(crear_proyecto("a", 2))
+    fuente = ZipSource(ruta)
+    combinada = CombinedSource(fuente)
+    foto = next(k for k in fuente if k.endswith(".jpg"))
+
+    datos = combinada[foto]
+    assert _abiertos(ruta) == 1
+    combinada.close()
+    assert _abiertos(ruta) == 0
+
+    # La fuente sigue siendo usable después de cerrarla
+    assert combinada[foto] == datos
+    with combinada.open(foto) as f:
+        assert f.read() == datos
+    combinada.close()
+    assert _abiertos(ruta) == 0
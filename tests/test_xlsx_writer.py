@@ -0,0 +1,60 @@
+import io
+from copy import copy
+
+from openpyxl import Workbook, load_workbook
+
+from app.report.xlsx_writer import aplicar_estilo_rango, alineacion, borde, fuente, relleno
+
+ESTILOS = [
+    dict(fill=relleno("F5F5F5")),
+    dict(font=fuente(bold=True, size=10), border=borde(estilo='thin')),
+    dict(alignment=alineacion(horizontal='left', vertical='center', wrap_text=True)),
+    dict(border=borde(estilo='medium', lados=('top',)), fill=relleno("E2F0D9")),
+]
+
+
+def _libro(aplicar):
+    """Hoja con celdas vacías, con valor, combinadas y con estilos previos distintos."""
+    wb = Workbook()
+    ws = wb.active
+    ws["B2"] = "texto"
+    ws["C3"].font = fuente(bold=False, size=9)
+    ws["D4"].fill = relleno("F8CBAD")
+    ws.merge_cells("B5:D6")
+    for rango, estilo in zip(["A1:E8", "B2:D6", "A1:C3", "C3:E8"], ESTILOS):
+        aplicar(ws, rango, **estilo)
+    return wb
+
+
+def _con_setters(ws, rango, font=None, fill=None, border=None, alignment=None):
+    for fila in ws[rango]:
+        for cell in fila:
+            if font:
+                cell.font = font
+            if fill:
+                cell.fill = fill
+            if border:
+                cell.border = border
+            if alignment:
+                cell.alignment = alignment
+
+
+def _estilos(wb):
+    ws = wb.active
+    # copy() desenvuelve los StyleProxy, que no se comparan entre sí
+    return {c.coordinate: (c.value, *map(copy, (c.font, c.fill, c.border, c.alignment, c.protection)), c.number_format)
+            for fila in ws.iter_rows(min_row=1, max_row=8, max_col=5) for c in fila}
+
+
+def _releer(wb):
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return load_workbook(buf)
+
+
+def test_aplicar_estilo_rango_igual_que_los_setters():
+    # Detecta cambios de openpyxl en el StyleArray interno que usa aplicar_estilo_rango
+    rapido, publico = _libro(aplicar_estilo_rango), _libro(_con_setters)
+    assert _estilos(rapido) == _estilos(publico)
+    assert _estilos(_releer(rapido)) == _estilos(_releer(publico))